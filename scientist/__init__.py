@@ -53,7 +53,7 @@ from scientist.experiment import Experiment
 from scientist.report import Report
 
 __docformat__ = 'restructuredtext en'
-__all__ = ('Scientist',)
+__all__ = ('Scientist', 'experiment')
 __version__ = '0.0.5'
 
 
@@ -63,7 +63,8 @@ class Scientist(object):
     Context manager for running experiments.
 
     Note you may override the Report and Experiment classes used either at the class level or
-    for the instance.
+    for the instance.  The same goes for the executor used to run trials in the background, the
+    sampler and the circuit breaker.
 
     Usage::
 
@@ -75,15 +76,28 @@ class Scientist(object):
     """
     report = Report
     experiment = Experiment
-
-    def __init__(self, description="Default Scientist Experiment", experiment_=None, report_=None):
+    # when set to a TrialExecutor, trials are run in the background instead of on the caller's thread.
+    executor = None
+    # when set to a Sampler, decides which calls run the trial instead of the experiment's duty_cycle.
+    sampler = None
+    # when set to a CircuitBreaker, skips the trials of experiments whose trials keep failing or are slow.
+    breaker = None
+
+    def __init__(self, description="Default Scientist Experiment", experiment_=None, report_=None, executor_=None,
+                 sampler_=None, breaker_=None):
         self.description = description
         self.experiment = experiment_ or Scientist.experiment
         self.report = report_ or Scientist.report
+        self.executor = executor_ or Scientist.executor
+        self.sampler = sampler_ or Scientist.sampler
+        self.breaker = breaker_ or Scientist.breaker
         self.__experiment = None
 
     def __enter__(self):
-        self.__experiment = self.experiment(description=self.description, report=self.report)
+        # only pass what is set so Experiment classes from before these arguments existed still work
+        kwargs = dict((name, value) for name, value in (('executor', self.executor), ('sampler', self.sampler),
+                                                        ('breaker', self.breaker)) if value is not None)
+        self.__experiment = self.experiment(description=self.description, report=self.report, **kwargs)
         return self.__experiment
 
     # noinspection PyUnusedLocal
@@ -92,3 +106,7 @@ class Scientist(object):
             self.__experiment.close()
         # returning false causes any exception raised during the context to be raised on context exit.
         return False
+
+
+# imported last since the decorator uses Scientist's class attributes
+import scientist.decorator
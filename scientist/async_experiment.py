@@ -0,0 +1,185 @@
+# coding=utf-8
+
+"""
+Asyncio flavored experiments.
+
+The control and trial functions may be coroutine functions or plain functions.  Plain functions are run
+in the event loop's default executor so they never block the event loop.  The trial is scheduled as it's
+own task before the control is awaited so the two overlap, and the trial task is cancelled if it has not
+finished within trial_timeout seconds after the control (a plain function's call is left to finish on it's
+executor thread).  Reports are fed from the event loop's
+default executor so a slow report never blocks the event loop.
+
+Usage::
+
+    async with AsyncScientist('description') as experiment:
+        experiment.control.function = original
+        experiment.trial.function = trial
+        control_result = await experiment.perform_async(user='me', password='sekret')
+
+"""
+import asyncio
+import functools
+import inspect
+
+from scientist import Scientist
+from scientist.experiment import Candidate, Experiment, Runner, status
+from scientist.observation import Observation
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('AsyncExperiment', 'AsyncScientist')
+
+
+class AsyncRunner(Runner):
+    async def execute_async(self, clean, **kwargs):
+        self.prepare(clean)
+        self.start()
+        try:
+            if inspect.iscoroutinefunction(self.function):
+                value = self.function(**kwargs)
+            else:
+                loop = asyncio.get_running_loop()
+                value = await loop.run_in_executor(None, functools.partial(self.function, **kwargs))
+            if inspect.isawaitable(value):
+                value = await value
+            self.value = value
+        except Exception as ex:
+            self.exception = ex
+        finally:
+            self.stop()
+
+
+class AsyncCandidate(Candidate, AsyncRunner):
+    pass
+
+
+class AsyncExperiment(Experiment):
+    """
+    An experiment whose control and trial functions are awaited by perform_async.  Candidates always run
+    concurrently as their own tasks.
+    """
+    candidate_class = AsyncCandidate
+
+    def __init__(self, description, report=None, executor=None, sampler=None, breaker=None):
+        super(AsyncExperiment, self).__init__(description, report=report, executor=executor, sampler=sampler,
+                                              breaker=breaker)
+        self.control = AsyncRunner()
+        self.trial = AsyncRunner()
+        self.pending_reports = []
+
+    async def perform_async(self, **kwargs):
+        """
+        Perform the experiment by awaiting the control function while, if enabled, the trial function runs as
+        a separate task.
+
+        :return: the control function's result
+        :raises: the control function's exception
+        """
+        context = dict(self.default_context)
+        context.update(self.context)
+        context.update(dict(kwargs))
+
+        trial_task = None
+        self.is_enabled = self.sampled(context)
+        tripped = self.tripped()
+        if self.is_enabled:
+            # the trial task runs while the control is awaited
+            self.check_trace_allocations()
+            self.before_run is not None and self.before_run(self)
+            trial_task = asyncio.get_running_loop().create_task(self.execute_trials_async(context))
+
+        try:
+            await self.control.execute_async(self.clean, **context)
+        except BaseException:
+            # perform_async itself was cancelled, so don't leave the trial running
+            trial_task is not None and trial_task.cancel()
+            raise
+
+        if trial_task is None:
+            self.status = status('open' if tripped else 'disabled')
+            self.publish()
+        else:
+            try:
+                # wait_for cancels the trial task when it times out
+                await asyncio.wait_for(trial_task, self.trial_timeout)
+            except asyncio.TimeoutError:
+                self.status = status('timeout')
+                self.publish()
+            else:
+                self.conclude(context)
+
+        self.recorder is not None and self.recorder.record(self.description, context, self.control)
+
+        # now return as the control function would have returned
+        if self.control.exception is not None:
+            raise self.control.exception
+        return self.control.value
+
+    async def execute_trials_async(self, context):
+        """
+        Await the trial function and the candidates.
+
+        :param context: the merged context to call the functions with
+        :type context: dict
+        """
+        runners = [candidate.execute_async(self.clean, **context) for candidate in self.candidates]
+        if self.runs_trial():
+            runners.insert(0, self.trial.execute_async(self.clean, **context))
+        await asyncio.gather(*runners)
+
+    def publish(self):
+        """
+        Record the outcome as an Observation, let the sampler and breaker observe it, then add it to the report
+        using the event loop's default executor.  Falls back to adding it directly when there is no running
+        event loop.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            super(AsyncExperiment, self).publish()
+            return
+        self.observation = Observation.from_experiment(self)
+        self.sampler is not None and self.sampler.observe(self.observation)
+        self.breaker is not None and self.breaker.observe(self.observation)
+        if self.report is not None:
+            self.pending_reports.append(loop.run_in_executor(None, self.report.add, self.observation))
+
+    async def close_async(self):
+        """
+        Wait for any reports still being added.
+        """
+        pending, self.pending_reports = self.pending_reports, []
+        if pending:
+            await asyncio.gather(*pending)
+        self.close()
+
+
+class AsyncScientist(Scientist):
+    """
+    Async context manager for running AsyncExperiments.
+
+    Usage::
+
+        async with AsyncScientist('description') as experiment:
+            experiment.control.function = original
+            experiment.trial.function = trial
+            control_result = await experiment.perform_async(user='me', password='sekret')
+
+    """
+    experiment = AsyncExperiment
+
+    def __init__(self, description="Default Scientist Experiment", experiment_=None, report_=None, executor_=None,
+                 sampler_=None, breaker_=None):
+        super(AsyncScientist, self).__init__(description, experiment_=experiment_ or AsyncScientist.experiment,
+                                             report_=report_, executor_=executor_, sampler_=sampler_,
+                                             breaker_=breaker_)
+        self.__experiment = None
+
+    async def __aenter__(self):
+        self.__experiment = self.__enter__()
+        return self.__experiment
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.__experiment is not None:
+            await self.__experiment.close_async()
+        return self.__exit__(exc_type, exc_val, exc_tb)
@@ -0,0 +1,249 @@
+# coding=utf-8
+
+"""
+Benchmark a trial against it's control offline before shipping it.
+
+Replays a corpus of recorded perform kwargs (one JSON object per line) through both functions using
+Experiment, so the timings and comparisons are the same as in production.  Both functions are first
+called warmup times with each kwargs without timing, then repeats timed passes are made over the corpus
+with the garbage collector disabled (it is run between passes).  Calls whose control or trial time is an
+outlier are rejected before the speedup is estimated.  A call is an outlier when it's time is more than
+outlier_range interquartile ranges outside the quartiles of the times of the calls with the same kwargs.
+
+Usage::
+
+    python -m scientist.bench myapp.orders:old_total myapp.orders:new_total orders.jsonl --repeats 20
+
+"""
+import argparse
+import gc
+import importlib
+import json
+import sys
+
+from scientist.experiment import Experiment
+from scientist.in_memory_report import InMemoryReport
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('Benchmark', 'load_corpus', 'main')
+
+
+class BenchmarkReport(InMemoryReport):
+    """
+    An InMemoryReport that is not kept in the report registry.
+    """
+
+    def __init__(self, description):
+        super(BenchmarkReport, self).__init__(description)
+        self.observations = []
+        self.mismatches = 0
+        self.rejected = 0
+
+    def add(self, observation):
+        """
+        Collect an observation, they are only appended once the outliers have been rejected.
+
+        :param observation: the outcome of a completed experiment
+        :type observation: Observation
+        """
+        self.observations.append(observation)
+
+    def __str__(self):
+        output = [super(BenchmarkReport, self).__str__()]
+        total = len(self.observations)
+        output.append("Mismatch rate: {rate:.3f}% ({mismatches} of {total} calls)".format(
+            rate=100.0 * self.mismatches / total if total else 0.0, mismatches=self.mismatches, total=total))
+        output.append("Rejected outliers: {rejected}".format(rejected=self.rejected))
+        return "\n".join(output)
+
+
+class Benchmark(object):
+    """
+    Times a control and a trial function over a corpus of kwargs.
+    """
+
+    def __init__(self, control, trial, corpus, description='benchmark', comparator=None, warmup=3, repeats=10,
+                 disable_gc=True, outlier_range=1.5):
+        """
+        :param control: the current function
+        :type control: callable
+        :param trial: the new function
+        :type trial: callable
+        :param corpus: the kwargs to call the functions with
+        :type corpus: list[dict]
+        :param description: the description of the report
+        :type description: str
+        :param comparator: compares the control's and trial's values, defaults to Experiment.compare
+        :type comparator: callable
+        :param warmup: the number of untimed calls of each function per kwargs before timing
+        :type warmup: int
+        :param repeats: the number of timed passes over the corpus
+        :type repeats: int
+        :param disable_gc: asserted to disable the garbage collector while timing
+        :type disable_gc: bool
+        :param outlier_range: the interquartile ranges outside the quartiles beyond which a time is an
+                              outlier, None to keep every call
+        :type outlier_range: float
+        """
+        self.control = control
+        self.trial = trial
+        self.corpus = list(corpus)
+        self.description = description
+        self.comparator = comparator
+        self.warmup = warmup
+        self.repeats = repeats
+        self.disable_gc = disable_gc
+        self.outlier_range = outlier_range
+
+    def run(self):
+        """
+        :return: the summarized report of the timed calls
+        :rtype: BenchmarkReport
+        """
+        report = BenchmarkReport(self.description)
+        gc_was_enabled = gc.isenabled()
+        for kwargs in self.corpus:
+            self.__warm_up(kwargs)
+        try:
+            for _ in range(self.repeats):
+                gc.collect()
+                self.disable_gc and gc.disable()
+                for kwargs in self.corpus:
+                    self.__perform(report, kwargs)
+                gc_was_enabled and gc.enable()
+        finally:
+            gc_was_enabled and gc.enable()
+
+        report.mismatches = sum(observation.status == 'contrite' for observation in report.observations)
+        kept = self.reject_outliers(report.observations)
+        report.rejected = len(report.observations) - len(kept)
+        for observation in kept:
+            report.append(observation)
+        report.summarize()
+        return report
+
+    def reject_outliers(self, observations):
+        """
+        Outliers are found among the repeated calls with the same kwargs, since different kwargs may take
+        very different times.
+
+        :param observations: the observations of the timed calls, in the order they were made
+        :type observations: list[Observation]
+        :return: the observations whose control and trial times are not outliers
+        :rtype: list[Observation]
+        """
+        kept = []
+        for index in range(len(self.corpus)):
+            calls = [observation for observation in observations[index::len(self.corpus)]
+                     if observation.trial_elapsed_ns is not None]
+            if self.outlier_range is None or len(calls) < 4:
+                kept.extend(calls)
+                continue
+            control_low, control_high = self.__fences([observation.control_elapsed_ns for observation in calls])
+            trial_low, trial_high = self.__fences([observation.trial_elapsed_ns for observation in calls])
+            kept.extend(observation for observation in calls
+                        if control_low <= observation.control_elapsed_ns <= control_high and
+                        trial_low <= observation.trial_elapsed_ns <= trial_high)
+        return kept
+
+    def __fences(self, times):
+        times = sorted(times)
+        first = _quantile(times, 0.25)
+        third = _quantile(times, 0.75)
+        spread = (third - first) * self.outlier_range
+        return first - spread, third + spread
+
+    def __warm_up(self, kwargs):
+        for _ in range(self.warmup):
+            for function in (self.control, self.trial):
+                try:
+                    function(**kwargs)
+                except Exception:
+                    pass
+
+    def __perform(self, report, kwargs):
+        experiment = Experiment(self.description, report=report)
+        # the corpus has the complete kwargs, so don't add the default context
+        experiment.default_context = {}
+        experiment.context = {}
+        experiment.control.function = self.control
+        experiment.trial.function = self.trial
+        if self.comparator is not None:
+            experiment.comparator = self.comparator
+        try:
+            experiment.perform(**kwargs)
+        except Exception:
+            # the control's exception, which was recorded like any other result
+            pass
+
+
+def _quantile(values, fraction):
+    # linear interpolation between the closest ranks of the sorted values
+    position = (len(values) - 1) * fraction
+    index = int(position)
+    if index + 1 >= len(values):
+        return values[index]
+    return values[index] + (values[index + 1] - values[index]) * (position - index)
+
+
+def load_corpus(path):
+    """
+    :param path: a file with a JSON object of perform kwargs on each line
+    :type path: str
+    :return: the kwargs
+    :rtype: list[dict]
+    """
+    with open(path) as in_file:
+        return [json.loads(line) for line in in_file if line.strip()]
+
+
+def load_function(spec):
+    """
+    :param spec: the function as "module:name", ex: "myapp.orders:total"
+    :type spec: str
+    :return: the function
+    :rtype: callable
+    """
+    module_name, _, name = spec.partition(':')
+    if not name:
+        raise ValueError("Expected module:function, got {spec!r}".format(spec=spec))
+    function = importlib.import_module(module_name)
+    for part in name.split('.'):
+        function = getattr(function, part)
+    return function
+
+
+def main(argv=None):
+    """
+    The scientist-bench command.
+
+    :param argv: the command line arguments, defaults to sys.argv[1:]
+    :type argv: list[str]
+    :return: the exit code
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(prog='scientist-bench', description="Benchmark a trial against it's control.")
+    parser.add_argument('control', help="the control function as module:function")
+    parser.add_argument('trial', help="the trial function as module:function")
+    parser.add_argument('corpus', help="a file of perform kwargs, one JSON object per line")
+    parser.add_argument('--comparator', help="a comparator function as module:function")
+    parser.add_argument('--warmup', type=int, default=3, help="untimed calls per kwargs before timing")
+    parser.add_argument('--repeats', type=int, default=10, help="timed passes over the corpus")
+    parser.add_argument('--keep-gc', action='store_true', help="leave the garbage collector enabled while timing")
+    parser.add_argument('--outlier-range', type=float, default=1.5,
+                        help="interquartile ranges beyond the quartiles for a time to be an outlier")
+    parser.add_argument('--keep-outliers', action='store_true', help="do not reject outliers")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, '')
+    benchmark = Benchmark(load_function(args.control), load_function(args.trial), load_corpus(args.corpus),
+                          description='{control} vs {trial}'.format(control=args.control, trial=args.trial),
+                          comparator=args.comparator and load_function(args.comparator), warmup=args.warmup,
+                          repeats=args.repeats, disable_gc=not args.keep_gc,
+                          outlier_range=None if args.keep_outliers else args.outlier_range)
+    print(benchmark.run())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# coding=utf-8
+
+"""
+A circuit breaker stops running an experiment's trial while it is failing or slow.
+
+Each experiment description has it's own circuit.  A closed circuit runs the trial and keeps the outcomes
+of the last window trials.  Once at least min_calls of them are kept and the share that failed (contrite,
+error, timeout, killed or crashed status) is over max_failure_rate, or their mean time is over
+max_trial_time seconds, the circuit opens.  An open circuit skips the trial (the experiment is reported
+with an 'open' status) until cooldown seconds have passed, then the circuit is half open and the next call
+runs the trial as a probe while the other calls still skip it.  The circuit closes if the probe succeeds and
+opens again if it fails.
+
+Usage::
+
+    Scientist.breaker = CircuitBreaker(max_failure_rate=0.2, max_trial_time=0.5, cooldown=60)
+
+"""
+import threading
+import time
+from collections import deque
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('CircuitBreaker', 'CLOSED', 'OPEN', 'HALF_OPEN')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half open'
+
+
+class CircuitBreaker(object):
+    """
+    Decides whether an experiment's trial is run from the outcomes of it's recent trials.  One breaker may
+    be shared by any number of experiments.
+    """
+    failed_statuses = ('contrite', 'error', 'timeout', 'killed', 'crashed')
+    # statuses where the trial did not run
+    skipped_statuses = ('init', 'disabled', 'dropped', 'ignored', 'open')
+
+    def __init__(self, max_failure_rate=0.5, max_trial_time=None, window=20, min_calls=10, cooldown=30.0,
+                 clock=time.monotonic):
+        """
+        :param max_failure_rate: the highest healthy share of failed trials, 0 to 1
+        :type max_failure_rate: float
+        :param max_trial_time: the highest healthy mean trial time in seconds, None to ignore trial times
+        :type max_trial_time: float
+        :param window: the number of recent trials kept
+        :type window: int
+        :param min_calls: the fewest kept trials the circuit may open on
+        :type min_calls: int
+        :param cooldown: the seconds an open circuit waits before probing the trial again
+        :type cooldown: float
+        :param clock: returns the current time in seconds
+        :type clock: callable
+        """
+        self.max_failure_rate = max_failure_rate
+        self.max_trial_time = max_trial_time
+        self.window = window
+        self.min_calls = min(min_calls, window)
+        self.cooldown = cooldown
+        self.clock = clock
+        self.circuits = {}
+        self.__lock = threading.Lock()
+
+    def state(self, description):
+        """
+        :param description: the experiment's description
+        :type description: str
+        :return: the state of the experiment's circuit, CLOSED, OPEN or HALF_OPEN
+        :rtype: str
+        """
+        circuit = self.circuits.get(description)
+        if circuit is None:
+            return CLOSED
+        with self.__lock:
+            if circuit.state == OPEN and self.clock() >= circuit.opened + self.cooldown:
+                return HALF_OPEN
+            return circuit.state
+
+    def allow(self, description):
+        """
+        Should the trial be run?
+
+        :param description: the experiment's description
+        :type description: str
+        :return: asserted to run the trial, false if the circuit is open or is already probing
+        :rtype: bool
+        """
+        circuit = self.circuits.get(description)
+        if circuit is None or circuit.state == CLOSED:
+            return True
+        with self.__lock:
+            now = self.clock()
+            if circuit.state == OPEN:
+                if now < circuit.opened + self.cooldown:
+                    return False
+                circuit.state = HALF_OPEN
+            elif now < circuit.probed + self.cooldown:
+                # a probe is running.  If it's outcome is never observed (ex: it was dropped) probe again
+                # after another cooldown.
+                return False
+            circuit.probed = now
+            return True
+
+    def observe(self, observation):
+        """
+        Called with the observation of every experiment before it is reported.
+
+        :param observation: the outcome of an experiment
+        :type observation: Observation
+        """
+        if observation.status in self.skipped_statuses:
+            return
+        failed = observation.status in self.failed_statuses or observation.trial_exception is not None
+        elapsed_ns = observation.trial_elapsed_ns
+        with self.__lock:
+            circuit = self.circuits.get(observation.description)
+            if circuit is None:
+                circuit = self.circuits[observation.description] = _Circuit(self.window)
+            if circuit.state == HALF_OPEN:
+                # the probe's outcome decides
+                if failed or self.__slow(elapsed_ns or 0, 1):
+                    self.__open(circuit)
+                else:
+                    circuit.state = CLOSED
+                    circuit.reset()
+                return
+            if circuit.state == OPEN:
+                # a trial that started before the circuit opened
+                return
+            if len(circuit.outcomes) == self.window:
+                old_failed, old_elapsed_ns = circuit.outcomes[0]
+                circuit.failures -= old_failed
+                if old_elapsed_ns is not None:
+                    circuit.timed -= 1
+                    circuit.trial_ns -= old_elapsed_ns
+            circuit.outcomes.append((failed, elapsed_ns))
+            circuit.failures += failed
+            if elapsed_ns is not None:
+                circuit.timed += 1
+                circuit.trial_ns += elapsed_ns
+            count = len(circuit.outcomes)
+            if count >= self.min_calls and (circuit.failures > self.max_failure_rate * count or
+                                            self.__slow(circuit.trial_ns, circuit.timed)):
+                self.__open(circuit)
+
+    def __slow(self, trial_ns, timed):
+        return self.max_trial_time is not None and timed > 0 and trial_ns / timed / 1e9 > self.max_trial_time
+
+    def __open(self, circuit):
+        circuit.state = OPEN
+        circuit.opened = self.clock()
+        circuit.reset()
+
+
+class _Circuit(object):
+    # the state of one experiment's circuit and the outcomes of it's recent trials as (failed, elapsed_ns)
+    def __init__(self, window):
+        self.state = CLOSED
+        self.opened = None
+        self.probed = None
+        self.outcomes = deque(maxlen=window)
+        self.failures = 0
+        self.timed = 0
+        self.trial_ns = 0
+
+    def reset(self):
+        self.outcomes.clear()
+        self.failures = 0
+        self.timed = 0
+        self.trial_ns = 0
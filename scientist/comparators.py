@@ -0,0 +1,230 @@
+# coding=utf-8
+
+"""
+Comparators for numeric results, for use as an experiment's comparator.
+
+The comparators return a Comparison, which is true when the values are equal and records the largest
+absolute difference between the values' numbers in deviation.  The experiment records the deviation in
+it's observation and the report shows the largest deviation seen.
+
+numpy arrays (and, when numpy is installed, memoryviews and array.arrays) are compared with vectorized
+operations on views of their buffers, chunk_size elements at a time so the temporary arrays stay small.
+Without numpy, buffers are compared element by element.
+
+Usage::
+
+    with Scientist('port to numpy') as experiment:
+        experiment.comparator = ToleranceComparator(rel_tol=1e-6, nan_equal=True)
+        ...
+
+"""
+import array
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('Comparison', 'ToleranceComparator', 'NanEqualComparator')
+
+# the numpy dtype kinds compared with tolerance: signed and unsigned ints, floats and complex numbers
+_NUMERIC_KINDS = 'iufc'
+
+
+class Comparison(object):
+    """
+    The result of a comparison.  It is true when the values are equal.
+    """
+    __slots__ = ('equal', 'deviation')
+
+    def __init__(self, equal, deviation=None):
+        """
+        :param equal: asserted if the values are equal
+        :type equal: bool
+        :param deviation: the largest absolute difference between the values' numbers, None if they have none
+        :type deviation: float
+        """
+        self.equal = equal
+        self.deviation = deviation
+
+    def __bool__(self):
+        return self.equal
+
+    def __repr__(self):
+        return 'Comparison({equal!r}, {deviation!r})'.format(equal=self.equal, deviation=self.deviation)
+
+
+class ToleranceComparator(object):
+    """
+    Compares numbers, and lists, tuples, dicts and arrays of numbers, as equal when they are within abs_tol
+    of each other or within rel_tol relative to the larger one (see math.isclose).  NaNs are equal to each
+    other when nan_equal is asserted.  Other values are compared with ==.
+    """
+
+    def __init__(self, rel_tol=1e-09, abs_tol=0.0, nan_equal=False, chunk_size=65536):
+        """
+        :param rel_tol: the largest difference between equal numbers relative to the larger one
+        :type rel_tol: float
+        :param abs_tol: the largest absolute difference between equal numbers
+        :type abs_tol: float
+        :param nan_equal: asserted if NaNs are equal to each other
+        :type nan_equal: bool
+        :param chunk_size: the number of array elements compared at a time
+        :type chunk_size: int
+        """
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.nan_equal = nan_equal
+        self.chunk_size = chunk_size
+
+    def __call__(self, control, trial):
+        """
+        :param control: the control's value
+        :param trial: the trial's value
+        :return: the comparison of the values
+        :rtype: Comparison
+        """
+        if _is_array(control) and _is_array(trial):
+            return self.compare_arrays(control, trial)
+        largest = _Largest()
+        equal = self.compare_values(control, trial, largest)
+        return Comparison(equal, largest.value)
+
+    def compare_values(self, control, trial, largest):
+        """
+        :param control: the control's value
+        :param trial: the trial's value
+        :param largest: keeps the largest absolute difference of the numbers compared so far
+        :type largest: _Largest
+        :return: asserted if the values are equal
+        :rtype: bool
+        """
+        if _is_number(control) and _is_number(trial):
+            return self.compare_numbers(control, trial, largest)
+        if _is_array(control) or _is_array(trial):
+            if not (_is_array(control) and _is_array(trial)):
+                # an array is never equal to a value that is not an array
+                return False
+            comparison = self.compare_arrays(control, trial)
+            largest.add(comparison.deviation)
+            return comparison.equal
+        if isinstance(control, (list, tuple, array.array, memoryview)) and type(control) is type(trial):
+            if len(control) != len(trial):
+                return False
+            # compare every element so the deviation is the largest one
+            equal = True
+            for item_1, item_2 in zip(control, trial):
+                equal = self.compare_values(item_1, item_2, largest) and equal
+            return equal
+        if isinstance(control, dict) and isinstance(trial, dict):
+            if control.keys() != trial.keys():
+                return False
+            equal = True
+            for key, value in control.items():
+                equal = self.compare_values(value, trial[key], largest) and equal
+            return equal
+        try:
+            return bool(control == trial)
+        except (TypeError, ValueError):
+            # == did not return something with a truth value, ex: an elementwise comparison
+            return False
+
+    def compare_numbers(self, control, trial, largest):
+        """
+        :param control: the control's number
+        :param trial: the trial's number
+        :param largest: keeps the largest absolute difference of the numbers compared so far
+        :type largest: _Largest
+        :return: asserted if the numbers are equal
+        :rtype: bool
+        """
+        if numpy is not None:
+            # numpy scalars become python numbers so their arithmetic can not wrap around
+            control = control.item() if isinstance(control, numpy.generic) else control
+            trial = trial.item() if isinstance(trial, numpy.generic) else trial
+        if control == trial:
+            largest.add(0.0)
+            return True
+        try:
+            if math.isnan(control) or math.isnan(trial):
+                return self.nan_equal and math.isnan(control) and math.isnan(trial)
+            largest.add(float(abs(control - trial)))
+            return math.isclose(control, trial, rel_tol=self.rel_tol, abs_tol=self.abs_tol)
+        except OverflowError:
+            # an int too large to be a float is only equal to itself
+            largest.add(float('inf'))
+            return False
+
+    def compare_arrays(self, control, trial):
+        """
+        :param control: the control's array
+        :param trial: the trial's array
+        :return: the comparison of the arrays
+        :rtype: Comparison
+        """
+        # asarray and reshape return views, so the buffers are only copied if an array is not contiguous
+        control = numpy.asarray(control)
+        trial = numpy.asarray(trial)
+        if control.shape != trial.shape:
+            return Comparison(False)
+        if control.dtype.kind not in _NUMERIC_KINDS or trial.dtype.kind not in _NUMERIC_KINDS:
+            # strings, objects, dates and bools have no tolerance or deviation
+            try:
+                return Comparison(bool(numpy.array_equal(control, trial)))
+            except (TypeError, ValueError):
+                return Comparison(False)
+        control = control.reshape(-1)
+        trial = trial.reshape(-1)
+        dtype = numpy.result_type(control, trial, numpy.float64)
+        equal = True
+        deviation = None
+        with numpy.errstate(invalid='ignore', over='ignore'):
+            for start in range(0, len(control), self.chunk_size):
+                chunk_1 = control[start:start + self.chunk_size]
+                chunk_2 = trial[start:start + self.chunk_size]
+                difference = numpy.abs(numpy.subtract(chunk_1, chunk_2, dtype=dtype))
+                bound = numpy.maximum(self.rel_tol * numpy.maximum(numpy.abs(chunk_1), numpy.abs(chunk_2)),
+                                      self.abs_tol)
+                close = (chunk_1 == chunk_2) | (difference <= bound)
+                if self.nan_equal:
+                    close |= numpy.isnan(chunk_1) & numpy.isnan(chunk_2)
+                equal = equal and bool(close.all())
+                # fmax ignores the NaNs from NaN elements and from subtracting equal infinities
+                chunk_deviation = numpy.fmax.reduce(numpy.where(chunk_1 == chunk_2, 0.0, difference))
+                if not numpy.isnan(chunk_deviation):
+                    deviation = float(chunk_deviation) if deviation is None else max(deviation, float(chunk_deviation))
+        return Comparison(equal, deviation)
+
+
+class NanEqualComparator(ToleranceComparator):
+    """
+    Compares like == except that NaNs are equal to each other.
+    """
+
+    def __init__(self, chunk_size=65536):
+        super(NanEqualComparator, self).__init__(rel_tol=0.0, abs_tol=0.0, nan_equal=True, chunk_size=chunk_size)
+
+
+def _is_number(value):
+    if numpy is not None and isinstance(value, (numpy.integer, numpy.floating)):
+        return True
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_array(value):
+    # without numpy, buffers are compared as sequences
+    return numpy is not None and isinstance(value, (numpy.ndarray, array.array, memoryview))
+
+
+class _Largest(object):
+    # the largest deviation seen, None until a number is compared
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = None
+
+    def add(self, deviation):
+        if deviation is not None and (self.value is None or deviation > self.value):
+            self.value = deviation
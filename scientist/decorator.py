@@ -0,0 +1,170 @@
+# coding=utf-8
+
+"""
+A decorator that runs every call of the decorated (control) function as an experiment.
+
+The report, experiment class, sampler, breaker and executor are resolved from Scientist when the function
+is decorated, so a call only maps it's positional arguments to their parameter names and, when it is
+sampled out, calls the control directly and counts the call in the report.  Sampled calls are performed
+by a new experiment like any other.
+
+The decorator is also available as scientist.experiment: the scientist.experiment module is callable, so
+it stays importable as a module while ``@scientist.experiment(...)`` decorates.
+
+The wrapper keeps the control's signature.  Positional arguments are passed to the control and trial by
+name, so a control with positional only parameters or a \\*args parameter can not be decorated.
+
+Usage::
+
+    @scientist.experiment('order total', trial=new_total, sample=1.0)
+    def total(order, discount=None):
+        ...
+
+"""
+import functools
+import inspect
+
+from scientist import Scientist
+from scientist.async_experiment import AsyncExperiment
+from scientist.observation import Observation
+from scientist.sampler import RateSampler, Sampler
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('experiment',)
+
+
+def experiment(description, trial=None, comparator=None, sample=None, clean=None, ignore=None, candidates=None,
+               report=None):
+    """
+    Decorate a control function so each call is an experiment comparing it with the trial.
+
+    Coroutine functions are performed with perform_async, by Scientist.experiment if it is an
+    AsyncExperiment and otherwise by AsyncExperiment.
+
+    :param description: the experiment's description
+    :type description: str
+    :param trial: the new function, called with the same arguments as the control
+    :type trial: callable
+    :param comparator: compares the control's and trial's values, defaults to Experiment.compare
+    :type comparator: callable
+    :param sample: the percent of calls to run the trial for, or a Sampler, defaults to Scientist.sampler
+    :type sample: float|Sampler
+    :param clean: the experiment's clean function
+    :type clean: callable
+    :param ignore: the experiment's ignore function
+    :type ignore: callable
+    :param candidates: more functions to compare with the control by candidate name
+    :type candidates: dict
+    :param report: the report class or instance, defaults to Scientist.report
+    :return: the decorator
+    :rtype: callable
+    """
+    if isinstance(sample, Sampler) or sample is None:
+        sampler = sample if sample is not None else Scientist.sampler
+    else:
+        sampler = RateSampler(sample)
+    report = report if report is not None else Scientist.report
+    candidates = list((candidates or {}).items())
+
+    def decorator(function):
+        names = _positional_names(function)
+        count = _disabled_counter(report, description)
+        is_async = inspect.iscoroutinefunction(function)
+        experiment_class = Scientist.experiment
+        if is_async and not issubclass(experiment_class, AsyncExperiment):
+            experiment_class = AsyncExperiment
+        # the wrapper samples the call, so the experiment only passes it's observation on to the sampler
+        observer = _Observer(sampler) if sampler is not None else None
+        executor = Scientist.executor
+        breaker = Scientist.breaker
+
+        def prepare(kwargs):
+            instance = experiment_class(description, report=report, executor=executor, sampler=observer,
+                                        breaker=breaker)
+            # the call's arguments are the complete context
+            instance.default_context = {}
+            instance.context = {}
+            instance.control.function = function
+            instance.trial.function = trial
+            if comparator is not None:
+                instance.comparator = comparator
+            instance.clean = clean
+            instance.ignore = ignore
+            for name, candidate in candidates:
+                instance.add_candidate(name, candidate)
+            return instance
+
+        def arguments(args, kwargs):
+            # adds the positional arguments to kwargs by name, returns None if they don't fit the control's
+            # parameters
+            if len(args) > len(names):
+                return None
+            for name in names[:len(args)]:
+                if name in kwargs:
+                    return None
+            kwargs.update(zip(names, args))
+            return kwargs
+
+        if is_async:
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                if args and arguments(args, kwargs) is None:
+                    return await function(*args, **kwargs)
+                if sampler is not None and not sampler.sample(kwargs):
+                    count()
+                    return await function(**kwargs)
+                instance = prepare(kwargs)
+                try:
+                    return await instance.perform_async(**kwargs)
+                finally:
+                    await instance.close_async()
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if args and arguments(args, kwargs) is None:
+                    # let the control raise it's TypeError
+                    return function(*args, **kwargs)
+                if sampler is not None and not sampler.sample(kwargs):
+                    count()
+                    return function(**kwargs)
+                instance = prepare(kwargs)
+                try:
+                    return instance.perform(**kwargs)
+                finally:
+                    instance.close()
+        return wrapper
+
+    return decorator
+
+
+class _Observer(Sampler):
+    # passes the observations on to the wrapper's sampler without sampling the call again
+    def __init__(self, sampler):
+        super(_Observer, self).__init__()
+        self.sampler = sampler
+
+    def sample(self, context):
+        return True
+
+    def observe(self, observation):
+        self.sampler.observe(observation)
+
+
+def _positional_names(function):
+    # the names of the parameters positional arguments are passed to
+    names = []
+    for parameter in inspect.signature(function).parameters.values():
+        if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.VAR_POSITIONAL):
+            raise ValueError("{name} can not be an experiment's control since it's {parameter} parameter can "
+                             "not be passed by name".format(name=function.__name__, parameter=parameter.name))
+        if parameter.kind == parameter.POSITIONAL_OR_KEYWORD:
+            names.append(parameter.name)
+    return tuple(names)
+
+
+def _disabled_counter(report, description):
+    # counts a sampled out call in the report
+    disabled_counter = getattr(report, 'disabled_counter', None)
+    if disabled_counter is not None:
+        return disabled_counter(description)
+    return lambda: report.add(Observation.disabled(description))
@@ -0,0 +1,204 @@
+# coding=utf-8
+
+"""
+Structural differences between a control value and a trial value.
+
+dicts are compared key by key, sets by their members and lists and tuples by aligning their elements
+(so one inserted element is one difference rather than a difference at every index after it).  Numbers
+are equal when they are within tolerance (absolute) or relative_tolerance (relative to the larger).
+
+The comparison descends at most max_depth containers and stops after max_differences differences, so the
+cost is bounded for large values.  Sequences longer than max_sequence are compared index by index instead
+of being aligned.  numpy arrays, and other values whose == does not return a truth value, are compared as
+a whole and reported as one change.
+
+Usage::
+
+    print(diff({'a': [1, 2, 3]}, {'a': [1, 3], 'b': 1}))
+
+"""
+import math
+from collections import namedtuple
+from difflib import SequenceMatcher
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from scientist.fingerprint import fingerprint
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('diff', 'Diff', 'Difference')
+
+
+class Difference(namedtuple('Difference', ['path', 'kind', 'control', 'trial'])):
+    """
+    One difference.  The path is the tuple of keys and indexes leading to it from the top of the values and
+    kind is 'changed', 'added' (only in the trial) or 'removed' (only in the control).
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        if self.kind == 'added':
+            return "{path}: only in trial {trial!r}".format(path=format_path(self.path), trial=self.trial)
+        if self.kind == 'removed':
+            return "{path}: only in control {control!r}".format(path=format_path(self.path), control=self.control)
+        return "{path}: control {control!r}, trial {trial!r}".format(path=format_path(self.path),
+                                                                      control=self.control, trial=self.trial)
+
+
+class Diff(object):
+    """
+    The differences found between two values.  truncated is asserted when the comparison stopped at
+    max_differences.
+    """
+
+    def __init__(self, differences, truncated):
+        self.differences = differences
+        self.truncated = truncated
+
+    def __bool__(self):
+        return bool(self.differences)
+
+    def __len__(self):
+        return len(self.differences)
+
+    def __iter__(self):
+        return iter(self.differences)
+
+    def __str__(self):
+        lines = [str(difference) for difference in self.differences]
+        if self.truncated:
+            lines.append("...")
+        return "\n".join(lines)
+
+
+def format_path(path):
+    """
+    :param path: the keys and indexes leading to a difference
+    :type path: tuple
+    :return: the path as subscripts, ex: "value['a'][2]"
+    :rtype: str
+    """
+    return 'value' + ''.join('[{key!r}]'.format(key=key) for key in path)
+
+
+def diff(control, trial, tolerance=0.0, relative_tolerance=0.0, max_depth=8, max_differences=20,
+         max_sequence=1000):
+    """
+    :param control: the control's value
+    :param trial: the trial's value
+    :param tolerance: the largest absolute difference between equal numbers
+    :type tolerance: float
+    :param relative_tolerance: the largest difference between equal numbers relative to the larger one
+    :type relative_tolerance: float
+    :param max_depth: the most containers to descend into
+    :type max_depth: int
+    :param max_differences: the most differences to find
+    :type max_differences: int
+    :param max_sequence: the longest sequences to align
+    :type max_sequence: int
+    :return: the differences between the values
+    :rtype: Diff
+    """
+    differ = _Differ(tolerance, relative_tolerance, max_depth, max_differences, max_sequence)
+    try:
+        differ.compare((), control, trial, 0)
+    except _Full:
+        pass
+    return Diff(differ.differences, differ.truncated)
+
+
+class _Full(Exception):
+    pass
+
+
+class _Differ(object):
+    def __init__(self, tolerance, relative_tolerance, max_depth, max_differences, max_sequence):
+        self.tolerance = tolerance
+        self.relative_tolerance = relative_tolerance
+        self.max_depth = max_depth
+        self.max_differences = max_differences
+        self.max_sequence = max_sequence
+        self.differences = []
+        self.truncated = False
+
+    def add(self, path, kind, control=None, trial=None):
+        if len(self.differences) >= self.max_differences:
+            self.truncated = True
+            raise _Full()
+        self.differences.append(Difference(path, kind, control, trial))
+
+    def compare(self, path, control, trial, depth):
+        if _is_number(control) and _is_number(trial):
+            if not math.isclose(control, trial, rel_tol=self.relative_tolerance, abs_tol=self.tolerance):
+                self.add(path, 'changed', control, trial)
+        elif type(control) is not type(trial) or depth >= self.max_depth:
+            if not _equal(control, trial):
+                self.add(path, 'changed', control, trial)
+        elif isinstance(control, dict):
+            self.compare_dicts(path, control, trial, depth + 1)
+        elif isinstance(control, (set, frozenset)):
+            self.compare_sets(path, control, trial)
+        elif isinstance(control, (list, tuple)):
+            self.compare_sequences(path, control, trial, depth + 1)
+        elif not _equal(control, trial):
+            self.add(path, 'changed', control, trial)
+
+    def compare_dicts(self, path, control, trial, depth):
+        for key, value in control.items():
+            if key in trial:
+                self.compare(path + (key,), value, trial[key], depth)
+            else:
+                self.add(path + (key,), 'removed', control=value)
+        for key, value in trial.items():
+            if key not in control:
+                self.add(path + (key,), 'added', trial=value)
+
+    def compare_sets(self, path, control, trial):
+        for value in sorted(control - trial, key=repr):
+            self.add(path, 'removed', control=value)
+        for value in sorted(trial - control, key=repr):
+            self.add(path, 'added', trial=value)
+
+    def compare_sequences(self, path, control, trial, depth):
+        opcodes = None
+        if len(control) <= self.max_sequence and len(trial) <= self.max_sequence:
+            try:
+                matcher = SequenceMatcher(None, [fingerprint(item) for item in control],
+                                          [fingerprint(item) for item in trial], autojunk=False)
+                opcodes = matcher.get_opcodes()
+            except TypeError:
+                # an element can not be fingerprinted, so compare the elements index by index
+                pass
+        if opcodes is None:
+            for index in range(min(len(control), len(trial))):
+                self.compare(path + (index,), control[index], trial[index], depth)
+            opcodes = [('delete', len(trial), len(control), len(trial), len(trial)),
+                       ('insert', len(control), len(control), len(control), len(trial))]
+        for tag, control_start, control_end, trial_start, trial_end in opcodes:
+            if tag == 'replace' and control_end - control_start == trial_end - trial_start:
+                # the same number of elements changed in place, so look inside them
+                for offset in range(control_end - control_start):
+                    self.compare(path + (control_start + offset,), control[control_start + offset],
+                                 trial[trial_start + offset], depth)
+            elif tag != 'equal':
+                for index in range(control_start, control_end):
+                    self.add(path + (index,), 'removed', control=control[index])
+                for index in range(trial_start, trial_end):
+                    self.add(path + (index,), 'added', trial=trial[index])
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _equal(control, trial):
+    if numpy is not None and isinstance(control, numpy.ndarray) and isinstance(trial, numpy.ndarray):
+        return numpy.array_equal(control, trial)
+    try:
+        return bool(control == trial)
+    except (TypeError, ValueError):
+        # == did not return something with a truth value, ex: an array's elementwise comparison
+        return False
@@ -0,0 +1,105 @@
+# coding=utf-8
+
+"""
+Bounded background executor for running trials off of the caller's thread.
+"""
+import queue
+import threading
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('TrialExecutor',)
+
+
+class TrialExecutor(object):
+    """
+    A fixed size pool of daemon worker threads fed from a bounded queue.
+
+    When the queue is full, new work is dropped instead of blocking the caller so a slow trial can never
+    push back on the control path.  The worker threads are started lazily on the first submit.
+
+    Usage::
+
+        Scientist.executor = TrialExecutor(workers=2, max_queue=100)
+
+    """
+
+    def __init__(self, workers=1, max_queue=100):
+        """
+        :param workers: the number of worker threads
+        :type workers: int
+        :param max_queue: the maximum number of pending jobs before new jobs are dropped
+        :type max_queue: int
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.submitted = 0
+        self.dropped = 0
+        self.__queue = queue.Queue(maxsize=max_queue)
+        self.__threads = []
+        self.__lock = threading.Lock()
+
+    def submit(self, function, *args):
+        """
+        Queue the function to be called with the given args on a worker thread.
+
+        :param function: the callable to run in the background
+        :type function: callable
+        :return: asserted if queued, False if dropped because the queue is full
+        :rtype: bool
+        """
+        if not self.__threads:
+            self.__start()
+        try:
+            self.__queue.put_nowait((function, args))
+        except queue.Full:
+            with self.__lock:
+                self.dropped += 1
+            return False
+        with self.__lock:
+            self.submitted += 1
+        return True
+
+    def join(self):
+        """
+        Block until all queued jobs have been run.
+        """
+        self.__queue.join()
+
+    def shutdown(self, wait=True):
+        """
+        Stop the worker threads after the already queued jobs have been run.
+
+        :param wait: asserted to wait for the worker threads to finish
+        :type wait: bool
+        """
+        with self.__lock:
+            threads = self.__threads
+            self.__threads = []
+        for _ in threads:
+            self.__queue.put((None, None))
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def __start(self):
+        with self.__lock:
+            if self.__threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self.__work, name='scientist-trial-{0}'.format(index))
+                thread.daemon = True
+                thread.start()
+                self.__threads.append(thread)
+
+    def __work(self):
+        while True:
+            function, args = self.__queue.get()
+            try:
+                if function is None:
+                    return
+                function(*args)
+            except Exception as ex:
+                # a failing job must never take down the worker thread
+                print("Background trial failed: {error}".format(error=repr(ex)))
+            finally:
+                self.__queue.task_done()
@@ -2,38 +2,174 @@
 
 """
 Experiment for using old function and trying new function simultaneously.
+
+The module is callable as the experiment decorator (see scientist.decorator), ex:
+``@scientist.experiment('order total', trial=new_total)``.
 """
 
-import time
-from itertools import tee, repeat, chain, izip_longest
-from random import randint
+import sys
+import threading
+import tracemalloc
+import types
+from time import perf_counter_ns, process_time_ns
+
+from scientist.fingerprint import fingerprint
+from scientist.observation import Observation
+from scientist.sampler import thread_random
 
 __docformat__ = 'restructuredtext en'
 __all__ = ('Experiment',)
 
 
 class Runner(object):
+    """
+    Calls a function and captures it's result or exception along with how long it took.
+
+    elapsed_ns is measured with the monotonic high resolution performance counter and cpu_ns with the process's
+    CPU time (which includes any other threads running at the same time).  When trace_allocations is asserted,
+    peak_memory is the peak number of bytes allocated by python during the call as measured by tracemalloc.
+    Note tracemalloc is started on the first traced call and left running.  trace_allocations needs python
+    3.9 or later (for tracemalloc.reset_peak).  tracemalloc's peak is process wide, so it also counts the
+    allocations of any other thread running at the same time, which is why an experiment refuses to trace
+    allocations when it runs it's control, trial or candidates at the same time.
+
+    digest is the fingerprint of the value when the experiment compared the values by fingerprint.
+
+    outcome is set by runners that call the function in another process (see scientist.process_runner) to
+    'killed' or 'crashed' when the call did not return.
+    """
+    trace_allocations = False
+
     def __init__(self):
         self.function = None
         self.value = None
-        self.cleaned_value = None
+        self.clean = None
+        self.clean_exception = None
         self.exception = None
-        self.start_time = None
-        self.end_time = None
+        self.elapsed_ns = None
+        self.cpu_ns = None
+        self.peak_memory = None
+        self.digest = None
+        self.outcome = None
+        self.__cleaned = False
+        self.__cleaned_value = None
+        self.__start_ns = None
+        self.__start_cpu_ns = None
+        self.__start_memory = None
 
     def execute(self, clean, **kwargs):
+        self.prepare(clean)
+        self.start()
         try:
-            self.start_time = time.time()
             self.value = self.function(**kwargs)
-            if clean is not None:
-                self.cleaned_value = clean(self.function(**kwargs))
         except Exception as ex:
             self.exception = ex
         finally:
-            self.end_time = time.time()
+            self.stop()
+
+    def prepare(self, clean):
+        """
+        Forget the outcome of the previous call, so a runner executed again never reports it's old value,
+        exception or cleaned value.
+
+        :param clean: the clean function for the call's value
+        :type clean: callable
+        """
+        self.clean = clean
+        self.value = None
+        self.exception = None
+        self.clean_exception = None
+        self.elapsed_ns = None
+        self.cpu_ns = None
+        self.peak_memory = None
+        self.digest = None
+        self.outcome = None
+        self.__cleaned = False
+        self.__cleaned_value = None
+        self.__start_memory = None
+
+    def start(self):
+        """
+        Start measuring a call.
+        """
+        if self.trace_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if not hasattr(tracemalloc, 'reset_peak'):
+                raise RuntimeError("trace_allocations needs tracemalloc.reset_peak, which is new in python 3.9")
+            tracemalloc.reset_peak()
+            self.__start_memory = tracemalloc.get_traced_memory()[0]
+        self.__start_cpu_ns = process_time_ns()
+        self.__start_ns = perf_counter_ns()
+
+    def stop(self):
+        """
+        Stop measuring a call.
+        """
+        self.elapsed_ns = perf_counter_ns() - self.__start_ns
+        self.cpu_ns = process_time_ns() - self.__start_cpu_ns
+        if self.__start_memory is not None:
+            self.peak_memory = max(tracemalloc.get_traced_memory()[1] - self.__start_memory, 0)
+
+    @property
+    def elapsed(self):
+        """
+        :return: the elapsed time of the call in seconds or None if the call has not finished
+        :rtype: float
+        """
+        if self.elapsed_ns is None:
+            return None
+        return self.elapsed_ns / 1e9
+
+    @property
+    def cleaned_value(self):
+        """
+        The clean function applied to the value the function returned.  This is computed the first time it is
+        needed instead of when the function is executed, so experiments that are never reported in detail
+        never pay for cleaning.
+
+        :return: the cleaned value or None if there is no clean function or the function raised an exception
+        """
+        if not self.__cleaned:
+            self.__cleaned = True
+            if self.clean is not None and self.exception is None:
+                try:
+                    self.__cleaned_value = self.clean(self.value)
+                except Exception as ex:
+                    self.clean_exception = ex
+        return self.__cleaned_value
+
+
+class Candidate(Runner):
+    """
+    One of the named trials of a multi candidate experiment, with it's own status and deviation.
+    """
+
+    def __init__(self, name, function):
+        super(Candidate, self).__init__()
+        self.name = name
+        self.function = function
+        self.status = status('init')
+        self.deviation = None
+
+
+class Exhausted(object):
+    """
+    Marks the end of an iterable in an experiment's divergence.
+    """
+
+    def __repr__(self):
+        return '<exhausted>'
+
+
+EXHAUSTED = Exhausted()
+
+valid_statuses = ['init', 'disabled', 'ignored', 'match', 'contrite', 'error', 'dropped', 'timeout', 'killed',
+                  'crashed', 'open']
 
 
-valid_statuses = ['init', 'disabled', 'ignored', 'match', 'contrite', 'error']
+def _ignore():
+    pass
 
 
 def status(status_name):
@@ -49,17 +185,50 @@ class Experiment(object):
 
     Information about the experiment is encapsulated as instance attributes.
 
-    The experiment instance is then added to the Report system.
+    The outcome of the experiment is then recorded as an Observation and added to the Report system.
+    When digest is set to a function, the observation includes the digests of the control and trial values.
+    For large results, set comparator to compare_fingerprints to compare the values by their fingerprints
+    (see scientist.fingerprint) and record them in the observation.  For numeric results, use one of the
+    comparators in scientist.comparators, which also record the deviation between the values.
 
-    To lower the duty cycle of when the trial function is executed, adjust the asserted duty
-    cycle of the enabled method (ex: for 20% duty cycle, the enabled method should return rand(100) < 20).
+    When recorder is set to a scientist.recorder.Recorder, a sample of the calls' kwargs and control results
+    are recorded so they can be replayed offline.
+
+    To lower the duty cycle of when the trial function is executed, set duty_cycle to the percent of calls
+    to run the trial for (fractions allowed) or override the enabled method.  For more control (ex: sticky
+    per user sampling) set sampler to a scientist.sampler.Sampler, which then replaces enabled.
+
+    When breaker is set to a scientist.breaker.CircuitBreaker, the trial of an enabled call is skipped
+    while the circuit for the experiment's description is open and the experiment is reported with an
+    'open' status.
+
+    When an executor (see scientist.executor.TrialExecutor) is given, perform returns the control's result
+    as soon as the control finishes while the trial, the comparison and the reporting run on the
+    executor's worker threads.  If the executor's queue is full, the trial is skipped and the experiment
+    is reported with a 'dropped' status.
+
+    When concurrent is asserted (and there is no executor), the trial runs on it's own thread at the same
+    time as the control so perform takes max(control, trial) instead of their sum.  If the trial has not
+    finished within trial_timeout seconds after the control returns, the experiment is reported with a
+    'timeout' status instead of waiting for the trial.
+
+    To compare several implementations in one perform, add them with add_candidate.  Each candidate is
+    called with the same context after the trial (if trial.function is set), or all at once on their own
+    threads when concurrent_candidates is asserted, and gets it's own status and timings in the report.  The
+    experiment is 'contrite' when the trial or any candidate is.  Note a control's generator can only be
+    compared once, so use compare_generators with a trial and no candidates.
     """
+    # the class of the runners made by add_candidate
+    candidate_class = Candidate
 
     default_context = {}
 
-    def __init__(self, description, report=None):
+    def __init__(self, description, report=None, executor=None, sampler=None, breaker=None):
         self.description = description
         self.report = report
+        self.executor = executor
+        self.sampler = sampler
+        self.breaker = breaker
         self.comparator = self.compare
         self.clean = None
         self.ignore = None
@@ -70,6 +239,39 @@ class Experiment(object):
         self.status = status('init')
         self.duty_cycle = 100
         self.before_run = None
+        self.concurrent = False
+        self.trial_timeout = None
+        self.compare_max_elements = None
+        self.divergence = None
+        self.deviation = None
+        self.digest = None
+        self.recorder = None
+        self.observation = None
+        self.candidates = []
+        self.concurrent_candidates = False
+        # the trial or candidate whose results did not match the control's
+        self.contrary_runner = None
+        # the trial or candidate whose results the comparator is comparing with the control's, None for the trial
+        self.judged_runner = None
+        self.__disabled_counter = None
+        self.__counted_report = None
+
+    def add_candidate(self, name, function):
+        """
+        Add a trial function to compare with the control.
+
+        :param name: the candidate's name in the report
+        :type name: str
+        :param function: the candidate function, called with the same kwargs as the control
+        :type function: callable
+        :return: the candidate's runner
+        :rtype: Candidate
+        """
+        if any(candidate.name == name for candidate in self.candidates):
+            raise ValueError("There is already a candidate named {name!r}".format(name=name))
+        candidate = self.candidate_class(name, function)
+        self.candidates.append(candidate)
+        return candidate
 
     # noinspection PyMethodMayBeStatic
     def enabled(self):
@@ -81,53 +283,257 @@ class Experiment(object):
         :rtype: bool
         """
         if self.duty_cycle < 100:
-            return randint(1, 100) < self.duty_cycle
+            return thread_random().random() * 100.0 < self.duty_cycle
         return True
 
+    def sampled(self, context):
+        """
+        Should the trial be run for this call?  Asks the sampler if there is one, else enabled.
+
+        :param context: the merged context the functions will be called with
+        :type context: dict
+        :return: asserted to run the trial
+        :rtype: bool
+        """
+        if self.sampler is not None:
+            return self.sampler.sample(context)
+        return self.enabled()
+
     def perform(self, **kwargs):
         """
         Perform the experiment by running the control function and, if enabled, the trial function.  Capture the
-        results, any exceptions, and the start and end times.
+        results, any exceptions, and the timings.
+
+        Without a sampler or recorder, whether the experiment is enabled is decided before anything else and
+        a disabled call is passed straight to the control function (so the control runner is not used) and
+        only counted by the report.
 
         :param kwargs:
         :type kwargs:
         :return:
         :rtype:
         """
+        context_free = self.sampler is None and self.recorder is None
+        if context_free:
+            self.is_enabled = self.enabled()
+            if not self.is_enabled:
+                return self.perform_disabled(kwargs)
+
         context = dict(self.default_context)
         context.update(self.context)
-        context.update(dict(kwargs))
+        context.update(kwargs)
+        if not context_free:
+            self.is_enabled = self.sampled(context)
+        tripped = self.tripped()
+        if self.is_enabled and (self.concurrent or self.executor is not None or
+                                (self.concurrent_candidates and len(self.candidates) > 1)):
+            self.check_trace_allocations()
 
-        # run the control function
-        self.control.execute(clean=self.clean, **context)
-
-        # if enabled, run the trial function
+        if self.is_enabled and self.concurrent and self.executor is None:
+            self.run_concurrently(context)
+        else:
+            # run the control function
+            self.control.execute(clean=self.clean, **context)
 
-        self.is_enabled = self.enabled()
-        if self.is_enabled:
-            self.before_run is not None and self.before_run(self)
-            self.trial.execute(clean=self.clean, **context)
-            if self.ignore is not None and self.ignore(**context):
-                self.status = status('ignored')
+            # if enabled, run the trial function
+            if self.is_enabled:
+                if self.executor is None:
+                    self.run_trial(context)
+                elif not self.executor.submit(self.run_trial, context):
+                    self.status = status('dropped')
+                    self.publish()
             else:
-                self.status = status('match')
-                if self.control.exception != self.trial.exception:
-                    self.status = status('contrite')
-                else:
-                    if self.comparator is not None and not self.comparator(self.control.value, self.trial.value):
-                        self.status = status('contrite')
-        else:
-            self.status = status('disabled')
+                self.status = status('open' if tripped else 'disabled')
+                self.publish()
 
-        # add this experiment instance to the report
-        if self.report is not None:
-            self.report.add(self)
+        self.recorder is not None and self.recorder.record(self.description, context, self.control)
 
         # now return as the control function would have returned
         if self.control.exception is not None:
             raise self.control.exception
         return self.control.value
 
+    def check_trace_allocations(self):
+        """
+        Called before running the functions at the same time.  tracemalloc's peak is process wide, so the
+        functions' peak memory can not be told apart.
+
+        :raises: ValueError if any of the runners trace allocations
+        """
+        for runner in [self.control, self.trial] + self.candidates:
+            if runner.trace_allocations:
+                raise ValueError("{description} can not trace allocations while it's functions run at the same "
+                                 "time".format(description=self.description))
+
+    def tripped(self):
+        """
+        Skip the trial of an enabled call if the breaker's circuit is open, in which case is_enabled is
+        cleared.
+
+        :return: asserted if the trial is skipped
+        :rtype: bool
+        """
+        if self.is_enabled and self.breaker is not None and not self.breaker.allow(self.description):
+            self.is_enabled = False
+            return True
+        return False
+
+    def perform_disabled(self, kwargs):
+        """
+        The fast path of perform for a disabled experiment.  The control function is called directly and the
+        call is only counted by the report.
+
+        :param kwargs: the perform kwargs
+        :type kwargs: dict
+        :return: the control function's result
+        """
+        self.status = 'disabled'
+        if self.__counted_report is not self.report:
+            # look up the report's counter once rather than on every call
+            self.__counted_report = self.report
+            self.__disabled_counter = self.__find_disabled_counter()
+        self.__disabled_counter()
+        if self.default_context or self.context:
+            context = dict(self.default_context)
+            context.update(self.context)
+            context.update(kwargs)
+            return self.control.function(**context)
+        return self.control.function(**kwargs)
+
+    def __find_disabled_counter(self):
+        if self.report is None:
+            return _ignore
+        disabled_counter = getattr(self.report, 'disabled_counter', None)
+        if disabled_counter is None:
+            # a report without counters gets an observation for every call
+            return self.publish
+        return disabled_counter(self.description)
+
+    def run_trial(self, context):
+        """
+        Run the trial function, compare it's results against the control's, then add this experiment to
+        the report.  Called from perform, either inline or on one of the executor's worker threads.
+
+        :param context: the merged context the control function was called with
+        :type context: dict
+        """
+        self.before_run is not None and self.before_run(self)
+        self.execute_trials(context)
+        self.conclude(context)
+
+    def runs_trial(self):
+        """
+        :return: asserted if the trial function is run, which it is unless only candidates were given
+        :rtype: bool
+        """
+        return self.trial.function is not None or not self.candidates
+
+    def execute_trials(self, context):
+        """
+        Run the trial function and the candidates.
+
+        :param context: the merged context to call the functions with
+        :type context: dict
+        """
+        if self.runs_trial():
+            self.trial.execute(clean=self.clean, **context)
+        if self.concurrent_candidates and len(self.candidates) > 1:
+            threads = [threading.Thread(target=candidate.execute, args=(self.clean,), kwargs=context)
+                       for candidate in self.candidates]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            for thread in threads:
+                thread.join()
+        else:
+            for candidate in self.candidates:
+                candidate.execute(clean=self.clean, **context)
+
+    def run_concurrently(self, context):
+        """
+        Run the trial function on it's own thread while the control function runs on the caller's thread,
+        then wait at most trial_timeout seconds past the end of the control for the trial to finish.
+
+        :param context: the merged context to call the control and trial functions with
+        :type context: dict
+        """
+        self.before_run is not None and self.before_run(self)
+        thread = threading.Thread(target=self.execute_trials, args=(context,))
+        thread.daemon = True
+        thread.start()
+        self.control.execute(clean=self.clean, **context)
+        thread.join(self.trial_timeout)
+        if thread.is_alive():
+            # leave the trial running but don't let it hold up the caller
+            self.status = status('timeout')
+            self.publish()
+        else:
+            self.conclude(context)
+
+    def conclude(self, context):
+        """
+        Set the status by comparing the trial's results against the control's, then add this experiment to
+        the report.
+
+        :param context: the merged context the control and trial functions were called with
+        :type context: dict
+        """
+        if self.ignore is not None and self.ignore(**context):
+            self.status = status('ignored')
+            for candidate in self.candidates:
+                candidate.status = status('ignored')
+        else:
+            self.status = status('match')
+            if self.runs_trial():
+                if self.trial.outcome is not None:
+                    # the trial was killed or crashed so there is nothing to compare
+                    self.status = status(self.trial.outcome)
+                else:
+                    matched, self.deviation = self.judge(self.trial)
+                    if not matched:
+                        self.status = status('contrite')
+                        self.contrary_runner = self.trial
+            for candidate in self.candidates:
+                if candidate.outcome is not None:
+                    candidate.status = status(candidate.outcome)
+                    if self.status == 'match':
+                        self.status = candidate.status
+                    continue
+                matched, candidate.deviation = self.judge(candidate)
+                candidate.status = status('match' if matched else 'contrite')
+                if not matched and self.status == 'match':
+                    self.status = status('contrite')
+                    self.contrary_runner = candidate
+        self.publish()
+
+    def judge(self, runner):
+        """
+        Compare a trial's or candidate's results against the control's.
+
+        :param runner: the trial or a candidate
+        :type runner: Runner
+        :return: asserted if the results matched and the deviation measured by the comparator if any
+        :rtype: tuple
+        """
+        if self.control.exception != runner.exception:
+            return False, None
+        if self.comparator is None:
+            return True, None
+        self.judged_runner = runner
+        comparison = self.comparator(self.control.value, runner.value)
+        # comparators from scientist.comparators also measure how far apart the values are
+        return bool(comparison), getattr(comparison, 'deviation', None)
+
+    def publish(self):
+        """
+        Record the outcome as an Observation, let the sampler and breaker observe it, then add it to the report.
+        """
+        self.observation = Observation.from_experiment(self)
+        self.sampler is not None and self.sampler.observe(self.observation)
+        self.breaker is not None and self.breaker.observe(self.observation)
+        if self.report is not None:
+            self.report.add(self.observation)
+
     def close(self):
         pass
 
@@ -135,18 +541,66 @@ class Experiment(object):
     def compare(self, a, b):
         return a == b
 
-    # noinspection PyMethodMayBeStatic
-    def compare_generators(self, gen_1, gen_2):
-        list_1 = None
+    def compare_fingerprints(self, a, b):
+        """
+        Compare two values by their fingerprints.  The fingerprints are kept in the digest of the control and
+        of the runner being judged so the observation records them without hashing the values again.  Values
+        that can not be fingerprinted are compared with compare instead.
+        """
+        runner = self.trial if self.judged_runner is None else self.judged_runner
         try:
-            list_1 = list(gen_1)
-        except Exception as ex:
-            self.control.exception = ex
+            self.control.digest = fingerprint(a)
+            runner.digest = fingerprint(b)
+        except TypeError:
+            self.control.digest = runner.digest = None
+            return self.compare(a, b)
+        return self.control.digest == runner.digest
+
+    def compare_generators(self, gen_1, gen_2):
+        """
+        Compare two iterables element by element, stopping at the first difference so only one element from
+        each is held at a time.  Where they diverged is recorded in divergence as a tuple of
+        (index, control element, trial element), with EXHAUSTED standing in for the element of an iterable
+        that ended early.  If compare_max_elements is set, at most that many elements are compared.
+
+        An exception raised while iterating is recorded as the runner's exception and ends the comparison.
+        """
+        self.divergence = None
+        iter_1 = iter(gen_1)
+        iter_2 = iter(gen_2)
+        index = 0
+        while self.compare_max_elements is None or index < self.compare_max_elements:
+            item_1 = self.__next_item(iter_1, self.control)
+            item_2 = self.__next_item(iter_2, self.trial)
+            if item_1 is EXHAUSTED or item_2 is EXHAUSTED:
+                if item_1 is item_2:
+                    return True
+                self.divergence = (index, item_1, item_2)
+                return False
+            if item_1 != item_2:
+                self.divergence = (index, item_1, item_2)
+                return False
+            index += 1
+        return True
 
-        list_2 = None
+    @staticmethod
+    def __next_item(iterator, runner):
         try:
-            list_2 = list(gen_2)
+            return next(iterator)
+        except StopIteration:
+            return EXHAUSTED
         except Exception as ex:
-            self.trial.exception = ex
+            runner.exception = ex
+            return EXHAUSTED
+
+
+class _ExperimentModule(types.ModuleType):
+    # the class of this module, so calling the module decorates.  It's set here rather than by
+    # scientist.decorator so the module is callable however it was imported.
+    def __call__(self, description, **kwargs):
+        # imported here since the decorator imports this module
+        from scientist.decorator import experiment
+        return experiment(description, **kwargs)
+
 
-        return list_1 == list_2
+sys.modules[__name__].__class__ = _ExperimentModule
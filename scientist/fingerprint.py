@@ -0,0 +1,147 @@
+# coding=utf-8
+
+"""
+Fingerprints are short digests of a value's canonical serialization, used to compare and record large
+results without holding on to them.
+
+Sequences are hashed in order while dicts and sets are hashed independently of their order, so equal
+builtin values of the same types have the same fingerprint.  Unlike ==, an int and the equal float (or a
+list and the equal tuple) have different fingerprints and NaN has the same fingerprint as NaN.  numpy
+arrays, array.arrays and memoryviews are hashed by their element type, shape and raw bytes.  Enum members,
+classes and functions are hashed by their qualified names.  Other objects are hashed by their class name
+and attributes (vars or slots) when they have them, else by their pickle, so equal objects whose state
+differs have different fingerprints (ex: Decimal('1.1') and Decimal('1.10')).  A value that can not be
+hashed any of these ways raises TypeError.
+
+Usage::
+
+    with Scientist('big results') as experiment:
+        experiment.comparator = experiment.compare_fingerprints
+        ...
+
+"""
+import array
+import enum
+import hashlib
+import inspect
+import pickle
+import struct
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('fingerprint',)
+
+DIGEST_SIZE = 16
+_LENGTH = struct.Struct('<Q')
+_DOUBLE = struct.Struct('<d')
+_NAN = float('nan')
+
+
+def fingerprint(value, digest_size=DIGEST_SIZE):
+    """
+    :param value: the value to fingerprint
+    :param digest_size: the number of bytes in the digest
+    :type digest_size: int
+    :return: the value's fingerprint as a hex string
+    :rtype: str
+    """
+    hasher = hashlib.blake2b(digest_size=digest_size)
+    _feed(hasher.update, value)
+    return hasher.hexdigest()
+
+
+def _feed(update, value):
+    # each value is written as a type tag followed by it's length or a terminator so the serialization is
+    # unambiguous, ex: ['ab'] and ['a', 'b'] differ
+    if value is None:
+        update(b'N')
+    elif value is True or value is False:
+        update(b'T' if value else b'F')
+    elif isinstance(value, enum.Enum):
+        update(b'e' + _text(_name(type(value))) + _text(value.name))
+    elif isinstance(value, type) or inspect.isroutine(value):
+        update(b'c' + _text(_name(value)))
+    elif isinstance(value, int):
+        update(b'i' + str(value).encode('ascii') + b';')
+    elif isinstance(value, float):
+        # -0.0 == 0.0 and NaNs may have different payloads, so neither may change the bytes
+        update(b'f' + _DOUBLE.pack(_NAN if value != value else value + 0.0))
+    elif isinstance(value, str):
+        update(b's' + _text(value))
+    elif isinstance(value, (bytes, bytearray)):
+        update(b'b' + _LENGTH.pack(len(value)))
+        update(value)
+    elif isinstance(value, (array.array, memoryview)) or (hasattr(value, 'tobytes') and hasattr(value, 'dtype')):
+        _feed_array(update, value)
+    elif isinstance(value, (list, tuple)):
+        update((b'l' if isinstance(value, list) else b't') + _LENGTH.pack(len(value)))
+        for item in value:
+            _feed(update, item)
+    elif isinstance(value, dict):
+        _feed_unordered(update, b'd', [fingerprint(key) + fingerprint(item) for key, item in value.items()])
+    elif isinstance(value, (set, frozenset)):
+        _feed_unordered(update, b'S', [fingerprint(item) for item in value])
+    elif hasattr(value, '__dict__'):
+        update(b'o' + _text(type(value).__qualname__))
+        _feed(update, vars(value))
+    elif _slots(type(value)):
+        update(b'o' + _text(type(value).__qualname__))
+        _feed(update, dict((name, getattr(value, name, None)) for name in _slots(type(value))))
+    else:
+        try:
+            data = pickle.dumps(value, 4)
+        except Exception as ex:
+            raise TypeError("Can not fingerprint {value!r}: {error}".format(value=value, error=ex))
+        update(b'p' + _text(type(value).__qualname__) + _LENGTH.pack(len(data)))
+        update(data)
+
+
+def _feed_array(update, value):
+    # the element type and shape, then the raw bytes.  Arrays of objects are hashed element by element.
+    dtype = getattr(value, 'dtype', None)
+    if dtype is not None:
+        if dtype.hasobject:
+            update(b'l' + _text(type(value).__qualname__))
+            _feed(update, value.tolist())
+            return
+        layout = (dtype.str, tuple(value.shape))
+    elif isinstance(value, memoryview):
+        layout = (value.format, value.shape)
+    else:
+        layout = (value.typecode, (len(value),))
+    update(b'a' + _text(type(value).__qualname__) + _text(repr(layout)))
+    try:
+        view = memoryview(value)
+    except TypeError:
+        view = None
+    if view is not None and view.c_contiguous:
+        # hash the buffer in place rather than copying it
+        update(_LENGTH.pack(view.nbytes))
+        update(view.cast('B') if view.ndim else view.tobytes())
+    else:
+        data = value.tobytes()
+        update(_LENGTH.pack(len(data)))
+        update(data)
+
+
+def _name(value):
+    # the qualified name of a class or function
+    return '{module}.{name}'.format(module=getattr(value, '__module__', None),
+                                    name=getattr(value, '__qualname__', getattr(value, '__name__', None)))
+
+
+def _slots(cls):
+    # the names of the slots of the class and it's bases
+    return [name for klass in cls.__mro__ for name in getattr(klass, '__slots__', ())
+            if name not in ('__weakref__', '__dict__')]
+
+
+def _feed_unordered(update, tag, digests):
+    # hashing the sorted digests of the members makes the fingerprint independent of their order
+    update(tag + _LENGTH.pack(len(digests)))
+    for digest in sorted(digests):
+        update(digest.encode('ascii'))
+
+
+def _text(text):
+    data = text.encode('utf-8', 'surrogatepass')
+    return _LENGTH.pack(len(data)) + data
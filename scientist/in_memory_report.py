@@ -3,28 +3,250 @@
 """
 Handle an experiment's report.
 """
+import threading
 from textwrap import dedent
 
+from scientist.diff import diff
 from scientist.report import Report
+from scientist.sampler import thread_random
+from scientist.stats import LogHistogram, RunningStats, ratio_interval
 
 __docformat__ = 'restructuredtext en'
-__all__ = ('InMemoryReport',)
+__all__ = ('InMemoryReport', 'Aggregate', 'CandidateTotals', 'MergedReport')
+
+
+class CandidateTotals(object):
+    """
+    The totals of one candidate of a multi candidate experiment.
+    """
+
+    def __init__(self):
+        self.times = RunningStats()
+        self.statuses = {}
+        self.max_deviation = None
+
+    def append(self, candidate):
+        """
+        :param candidate: the outcome of the candidate in one experiment
+        :type candidate: CandidateObservation
+        """
+        self.statuses[candidate.status] = self.statuses.get(candidate.status, 0) + 1
+        if candidate.elapsed_ns is not None:
+            self.times.add(candidate.elapsed_ns / 1e9)
+        if candidate.deviation is not None:
+            self.add_deviation(candidate.deviation)
+
+    def merge(self, other):
+        """
+        :param other: the totals to add
+        :type other: CandidateTotals
+        """
+        for name, count in other.statuses.items():
+            self.statuses[name] = self.statuses.get(name, 0) + count
+        self.times.merge(other.times)
+        if other.max_deviation is not None:
+            self.add_deviation(other.max_deviation)
+
+    def add_deviation(self, deviation):
+        if self.max_deviation is None or deviation > self.max_deviation:
+            self.max_deviation = deviation
+
+    def correct(self):
+        """
+        :return: asserted if the candidate matched the control every time it was compared
+        :rtype: bool
+        """
+        return all(name in ('match', 'ignored') for name in self.statuses)
+
+
+class Aggregate(object):
+    """
+    The constant memory totals of a set of experiment observations.  Aggregates can be merged, which lets each
+    thread append to it's own aggregate and have them combined when the report is summarized.
+
+    Only a random sample (reservoir) of at most max_contrary_experiments contrary observations is kept.
+    """
+    # the attributes copied to the report when it is summarized
+    fields = ('control_count', 'enabled_count', 'contrary_experiments', 'contrary_results', 'control_times',
+              'trial_times', 'control_cpu_times', 'trial_cpu_times', 'control_memory', 'trial_memory',
+              'control_histogram', 'trial_histogram', 'statuses', 'max_deviation', 'candidates')
+    # the attributes that are merged with their own merge method
+    merged_fields = ('control_times', 'trial_times', 'control_cpu_times', 'trial_cpu_times', 'control_memory',
+                     'trial_memory', 'control_histogram', 'trial_histogram')
+
+    def __init__(self, max_contrary_experiments=10):
+        self.max_contrary_experiments = max_contrary_experiments
+        self.control_count = 0
+        self.enabled_count = 0
+        self.contrary_experiments = []
+        self.contrary_results = 0
+        self.control_times = RunningStats()
+        self.trial_times = RunningStats()
+        self.control_cpu_times = RunningStats()
+        self.trial_cpu_times = RunningStats()
+        self.control_memory = RunningStats()
+        self.trial_memory = RunningStats()
+        self.control_histogram = LogHistogram()
+        self.trial_histogram = LogHistogram()
+        self.statuses = {}
+        self.max_deviation = None
+        # calls of disabled experiments that were only counted, merge adds them to control_count and statuses
+        self.disabled_count = 0
+        # the CandidateTotals of a multi candidate experiment's candidates by name
+        self.candidates = {}
+
+    def append(self, observation):
+        """
+        Add an experiment's observation to the totals.
+
+        :param observation: the outcome of a completed experiment
+        :type observation: Observation
+        """
+        self.control_count += observation.count
+        self.statuses[observation.status] = self.statuses.get(observation.status, 0) + observation.count
+        if not observation.is_enabled:
+            return
+
+        self.enabled_count += 1
+        self.__add_times(observation.control_elapsed_ns, observation.control_cpu_ns, observation.control_peak_memory,
+                         self.control_times, self.control_histogram, self.control_cpu_times, self.control_memory)
+        # dropped and timed out experiments have no trial times
+        if observation.trial_elapsed_ns is not None:
+            self.__add_times(observation.trial_elapsed_ns, observation.trial_cpu_ns, observation.trial_peak_memory,
+                             self.trial_times, self.trial_histogram, self.trial_cpu_times, self.trial_memory)
+        if observation.deviation is not None:
+            self.add_deviation(observation.deviation)
+        if observation.candidates is not None:
+            for candidate in observation.candidates:
+                totals = self.candidates.get(candidate.name)
+                if totals is None:
+                    totals = self.candidates[candidate.name] = CandidateTotals()
+                totals.append(candidate)
+        if observation.status == 'contrite':
+            self.contrary_results += 1
+            self.__sample_contrary(observation)
+
+    def merge(self, other):
+        """
+        Add the totals of another aggregate to this one.
+
+        :param other: the aggregate to add
+        :type other: Aggregate
+        """
+        self.control_count += other.control_count
+        self.enabled_count += other.enabled_count
+        for name, count in other.statuses.items():
+            self.statuses[name] = self.statuses.get(name, 0) + count
+        if other.disabled_count:
+            self.control_count += other.disabled_count
+            self.statuses['disabled'] = self.statuses.get('disabled', 0) + other.disabled_count
+        for name in self.merged_fields:
+            getattr(self, name).merge(getattr(other, name))
+        if other.max_deviation is not None:
+            self.add_deviation(other.max_deviation)
+        for name, totals in other.candidates.items():
+            if name not in self.candidates:
+                self.candidates[name] = CandidateTotals()
+            self.candidates[name].merge(totals)
+        self.__merge_contrary(other.contrary_experiments, other.contrary_results)
+
+    def add_deviation(self, deviation):
+        """
+        :param deviation: the deviation between a control's and a trial's values
+        :type deviation: float
+        """
+        if self.max_deviation is None or deviation > self.max_deviation:
+            self.max_deviation = deviation
+
+    @staticmethod
+    def __add_times(elapsed_ns, cpu_ns, peak_memory, times, histogram, cpu_times, memory):
+        times.add(elapsed_ns / 1e9)
+        histogram.add(elapsed_ns)
+        cpu_times.add(cpu_ns / 1e9)
+        if peak_memory is not None:
+            memory.add(peak_memory)
+
+    def __sample_contrary(self, observation):
+        # reservoir sampling (Vitter's algorithm R) gives each contrary observation the same chance of being kept
+        if len(self.contrary_experiments) < self.max_contrary_experiments:
+            self.contrary_experiments.append(observation)
+        else:
+            index = thread_random().randint(0, self.contrary_results - 1)
+            if index < self.max_contrary_experiments:
+                self.contrary_experiments[index] = observation
+
+    def __merge_contrary(self, experiments, results):
+        combined = self.contrary_experiments + experiments
+        if len(combined) > self.max_contrary_experiments:
+            # each kept experiment stands for results / len(experiments) contrary results, so keep the merged
+            # sample uniform by weighted sampling without replacement (Efraimidis and Spirakis).
+            weights = ([self.contrary_results / float(len(self.contrary_experiments))] *
+                       len(self.contrary_experiments) + [results / float(len(experiments))] * len(experiments))
+            generator = thread_random()
+            keys = sorted(((generator.random() ** (1.0 / weight), index) for index, weight in enumerate(weights)),
+                          reverse=True)
+            combined = [combined[index] for _, index in keys[:self.max_contrary_experiments]]
+        self.contrary_experiments = combined
+        self.contrary_results += results
+
+
+class _Shard(Aggregate):
+    # one thread's aggregate.  It's lock is only ever contended while the report is being summarized.
+    def __init__(self, max_contrary_experiments):
+        super(_Shard, self).__init__(max_contrary_experiments)
+        self.lock = threading.Lock()
+        self.thread = threading.current_thread()
 
 
 class InMemoryReport(Report):
+    """
+    Aggregates experiment observations as they are appended so memory use does not grow with the number of
+    experiments.
+
+    Each thread appends to it's own Aggregate so reporting threads never wait on each other, and summarize
+    merges them.  Only a random sample (reservoir) of at most max_contrary_experiments contrary observations
+    is kept.
+    """
+    max_contrary_experiments = 10
+    # the percentiles of the control and trial times shown in the report
+    percentiles = (50, 90, 99, 99.9)
+    # the keyword arguments of scientist.diff.diff used to show the differences of the contrary results
+    diff_options = {}
+
     def __init__(self, description):
         super(InMemoryReport, self).__init__(description)
-        self.experiments = []
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__shards = []
+        # the totals of threads that have exited
+        self.__retired = Aggregate(self.max_contrary_experiments)
         self.control_count = 0
-        self.enabled_experiments = []
         self.enabled_count = 0
         self.contrary_experiments = []
         self.contrary_results = 0
-        self.control_elapse_times = []
+        self.control_times = RunningStats()
         self.control_avg_time = 0
-        self.trial_elapse_times = []
+        self.control_std_dev = 0
+        self.trial_times = RunningStats()
         self.trial_avg_time = 0
+        self.trial_std_dev = 0
+        self.control_cpu_times = RunningStats()
+        self.control_avg_cpu_time = 0
+        self.trial_cpu_times = RunningStats()
+        self.trial_avg_cpu_time = 0
+        self.control_memory = RunningStats()
+        self.trial_memory = RunningStats()
+        self.control_histogram = LogHistogram()
+        self.trial_histogram = LogHistogram()
+        # the control's mean time over the trial's mean time with a 95% confidence interval
+        self.speedup = None
+        self.speedup_low = None
+        self.speedup_high = None
         self.statuses = {}
+        self.max_deviation = None
+        self.candidates = {}
+        # the name of the candidate with the lowest average time of those that always matched the control
+        self.fastest_candidate = None
 
     def __str__(self):
         """
@@ -37,54 +259,167 @@ class InMemoryReport(Report):
         Total experiments: {control_count}
         Enabled experiments: {enabled_count}
         Contrary results: {contrary_results}
-        Average time for control code: {control_avg_time}
-        Average time for trial code: {trial_avg_time}
+        Average time for control code: {control_avg_time} (std dev {control_std_dev})
+        Average time for trial code: {trial_avg_time} (std dev {trial_std_dev})
+        Average CPU time for control code: {control_avg_cpu_time}
+        Average CPU time for trial code: {trial_avg_cpu_time}
         Statuses: {statuses}
         """.format(hr='-' * len(self.description), **self.__dict__))]
+        if self.control_histogram.count:
+            output.append("Control time percentiles: " + self.__percentiles(self.control_histogram))
+        if self.trial_histogram.count:
+            output.append("Trial time percentiles: " + self.__percentiles(self.trial_histogram))
+        if self.speedup is not None:
+            output.append("Trial speedup: {speedup:.3f}x (95% confidence interval {low:.3f}x to {high:.3f}x)".format(
+                speedup=self.speedup, low=self.speedup_low, high=self.speedup_high))
+        if self.max_deviation is not None:
+            output.append("Max deviation: {deviation}".format(deviation=self.max_deviation))
+        if self.control_memory.count or self.trial_memory.count:
+            output.append("Average peak memory for control code: {control} bytes".format(
+                control=self.control_memory.mean))
+            output.append("Average peak memory for trial code: {trial} bytes".format(trial=self.trial_memory.mean))
+        if self.candidates:
+            output.append("Candidates:")
+            for name, totals in self.candidates.items():
+                output.append("  {name}: average time {mean} (std dev {std_dev}), statuses {statuses}".format(
+                    name=name, mean=totals.times.mean, std_dev=totals.times.std_dev, statuses=totals.statuses))
+                if totals.max_deviation is not None:
+                    output.append("  {name}: max deviation {deviation}".format(name=name,
+                                                                              deviation=totals.max_deviation))
+            output.append("Fastest correct candidate: {name}".format(name=self.fastest_candidate))
+        output.append("")
         if self.contrary_experiments:
             output.append("Contrary Results:")
-            for experiment in self.contrary_experiments:
-                output.append("control value: " + repr(experiment.control.value))
-                output.append("trial value: " + repr(experiment.trial.value))
-                if experiment.control.cleaned_value is not None:
-                    output.append("control cleaned value: " + repr(experiment.control.cleaned_value))
-                if experiment.trial.cleaned_value is not None:
-                    output.append("trial cleaned value: " + repr(experiment.trial.cleaned_value))
+            for observation in self.contrary_experiments:
+                mismatch = observation.mismatch
+                output.append("control value: " + repr(mismatch.control.value))
+                label = 'trial' if getattr(mismatch.trial, 'name', None) is None else 'candidate ' + mismatch.trial.name
+                output.append(label + " value: " + repr(mismatch.trial.value))
+                if observation.control_digest is not None or observation.trial_digest is not None:
+                    output.append("digests: control {control}, trial {trial}".format(
+                        control=observation.control_digest, trial=observation.trial_digest))
+                if mismatch.divergence is not None:
+                    output.append("diverged at index {0}: control {1!r}, trial {2!r}".format(*mismatch.divergence))
+                elif mismatch.control.exception is None and mismatch.trial.exception is None:
+                    # only the sampled contrary results are ever diffed
+                    try:
+                        differences = diff(mismatch.control.value, mismatch.trial.value, **self.diff_options)
+                    except Exception as ex:
+                        # the values' own methods raised, which must not stop the report from rendering
+                        differences = None
+                        output.append("differences: unavailable ({error!r})".format(error=ex))
+                    if differences:
+                        output.append("differences:")
+                        output.extend("  " + line for line in str(differences).split("\n"))
+                if mismatch.control.cleaned_value is not None:
+                    output.append("control cleaned value: " + repr(mismatch.control.cleaned_value))
+                if mismatch.trial.cleaned_value is not None:
+                    output.append(label + " cleaned value: " + repr(mismatch.trial.cleaned_value))
                 output.append("")
         return "\n".join(output)
 
-    def append(self, experiment):
+    def append(self, observation):
+        """
+        Add an experiment's observation to the calling thread's aggregate.
+
+        :param observation: the outcome of a completed experiment
+        :type observation: Observation
+        """
+        shard = self.__shard()
+        with shard.lock:
+            shard.append(observation)
+
+    def disabled(self):
+        # only the owning thread changes a shard's disabled_count, so it does not need the lock
+        self.__shard().disabled_count += 1
+
+    def __shard(self):
+        # the calling thread's aggregate
+        shard = getattr(self.__local, 'shard', None)
+        if shard is None:
+            shard = self.__local.shard = _Shard(self.max_contrary_experiments)
+            with self.__lock:
+                # retire the shards of exited threads here too, so a thread per request server does not keep
+                # a shard per thread until the next summarize
+                self.__retire_shards()
+                self.__shards.append(shard)
+        return shard
+
+    def __retire_shards(self):
+        # fold the totals of exited threads together so the number of shards stays bounded.  Called with
+        # the lock held.
+        for shard in list(self.__shards):
+            if not shard.thread.is_alive():
+                with shard.lock:
+                    self.__retired.merge(shard)
+                self.__shards.remove(shard)
+
+    def __percentiles(self, histogram):
+        parts = ["p{percent}={value}".format(percent=percent, value=histogram.percentile(percent) / 1e9)
+                 for percent in self.percentiles]
+        parts.append("max={value}".format(value=histogram.maximum / 1e9))
+        return " ".join(parts)
+
+    def reset(self):
         """
-        Append an experiment instance to this report's list of experiments.
+        Forget everything appended so far, ex: in a forked child whose inherited totals are the parent's.
+        """
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__shards = []
+        self.__retired = Aggregate(self.max_contrary_experiments)
+
+    def aggregate(self):
+        """
+        Merge the aggregates of all the threads that have appended to this report.
 
-        :param experiment: the completed experiment instance
-        :type experiment: Experiment
+        :return: the merged totals
+        :rtype: Aggregate
         """
-        self.experiments.append(experiment)
+        merged = Aggregate(self.max_contrary_experiments)
+        with self.__lock:
+            self.__retire_shards()
+            merged.merge(self.__retired)
+            shards = list(self.__shards)
+        for shard in shards:
+            with shard.lock:
+                merged.merge(shard)
+        return merged
 
     def summarize(self):
         """
         Calculate the report values for this Report instance.
         """
-        self.control_count = len(self.experiments)
-        self.enabled_experiments = [experiment for experiment in self.experiments if experiment.is_enabled]
-        self.enabled_count = len(self.enabled_experiments)
-        self.contrary_experiments = [experiment for experiment in self.enabled_experiments
-                                     if experiment.status == 'contrite']
-        self.contrary_results = len(self.contrary_experiments)
+        merged = self.aggregate()
+        for name in Aggregate.fields:
+            setattr(self, name, getattr(merged, name))
+        self.control_avg_time = self.control_times.mean
+        self.control_std_dev = self.control_times.std_dev
+        self.trial_avg_time = self.trial_times.mean
+        self.trial_std_dev = self.trial_times.std_dev
+        self.control_avg_cpu_time = self.control_cpu_times.mean
+        self.trial_avg_cpu_time = self.trial_cpu_times.mean
+        self.speedup, self.speedup_low, self.speedup_high = (ratio_interval(self.control_times, self.trial_times) or
+                                                             (None, None, None))
+        correct = [(totals.times.mean, name) for name, totals in self.candidates.items()
+                   if totals.correct() and totals.times.count]
+        self.fastest_candidate = min(correct)[1] if correct else None
 
-        def elapsed(start, end):
-            return end - start
 
-        self.control_elapse_times = [elapsed(experiment.control.start_time, experiment.control.end_time) for experiment
-                                     in self.enabled_experiments]
-        self.control_avg_time = sum(self.control_elapse_times) / float(len(self.control_elapse_times))
+class MergedReport(InMemoryReport):
+    """
+    An InMemoryReport of totals that were already merged, ex: collected from other processes.
+    """
 
-        self.trial_elapse_times = [elapsed(experiment.trial.start_time, experiment.trial.end_time) for experiment in
-                                   self.enabled_experiments]
-        self.trial_avg_time = sum(self.trial_elapse_times) / float(len(self.trial_elapse_times))
-        self.statuses = {}
-        for experiment in self.experiments:
-            if experiment.status not in self.statuses:
-                self.statuses[experiment.status] = 0
-            self.statuses[experiment.status] += 1
+    def __init__(self, description, aggregate):
+        """
+        :param description: the description of the experiment
+        :type description: str
+        :param aggregate: the merged totals
+        :type aggregate: Aggregate
+        """
+        super(MergedReport, self).__init__(description)
+        self.__aggregate = aggregate
+
+    def aggregate(self):
+        return self.__aggregate
@@ -0,0 +1,347 @@
+# coding=utf-8
+
+"""
+Cross process reports for pre-fork servers (ex: gunicorn) where every worker process has it's own reports.
+
+Each process periodically writes the totals of it's MmapReports to it's own memory mapped file in
+MmapReport.directory using a compact binary encoding (no experiments are pickled).  Any process can then
+merge the files of all the workers into one summary.
+
+Usage::
+
+    # in the server configuration, before the workers are forked
+    MmapReport.configure('/run/myapp/scientist')
+    Scientist.report = MmapReport
+
+    # anywhere, ex: an admin endpoint or a separate script
+    print(collected_summary('/run/myapp/scientist'))
+
+A forked child starts it's MmapReports over, so the totals it inherited are only published by the parent.
+
+Note the contrary observations themselves are not shared between processes, only their count.
+"""
+import atexit
+import itertools
+import math
+import mmap
+import os
+import struct
+import threading
+import warnings
+
+from scientist.in_memory_report import Aggregate, CandidateTotals, InMemoryReport, MergedReport
+from scientist.report import Report
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('MmapReport', 'collect', 'collected_summary')
+
+MAGIC = b'SCIA'
+VERSION = 3
+# magic, version, sequence, payload length.  The sequence is odd while the payload is being written.
+HEADER = struct.Struct('<4sHxxQQ')
+STATS = struct.Struct('<Qdd')
+HISTOGRAM = struct.Struct('<BQI')
+BUCKET = struct.Struct('<IQ')
+COUNTS = struct.Struct('<QQQ')
+COUNT = struct.Struct('<I')
+LENGTH = struct.Struct('<H')
+NUMBER = struct.Struct('<Q')
+# NaN when there is no deviation
+DEVIATION = struct.Struct('<d')
+FILE_PREFIX = 'scientist-'
+FILE_SUFFIX = '.agg'
+
+
+class MmapReport(InMemoryReport):
+    """
+    An InMemoryReport that publishes it's process's totals to a memory mapped file every publish_every appends.
+    Call MmapReport.flush() to publish immediately, ex: when a worker is shutting down.
+
+    The periodic publishing happens on the thread performing the experiment, so it's errors (ex: the
+    directory is not set or the disk is full) are only counted in failed_flushes.
+    """
+    # the directory the per process files are written to
+    directory = None
+    publish_every = 100
+    failed_flushes = 0
+
+    def __init__(self, description):
+        super(MmapReport, self).__init__(description)
+        self.__appends = itertools.count(1)
+        if MmapReport.directory is None:
+            warnings.warn("MmapReport.directory is not set, so the {description!r} report will not be "
+                          "published".format(description=description), RuntimeWarning)
+
+    @classmethod
+    def configure(cls, directory, publish_every=None):
+        """
+        Set the directory the reports are published to, creating it if needed.
+
+        :param directory: the directory the per process files are written to
+        :type directory: str
+        :param publish_every: the number of appends between publishing, defaults to the current value
+        :type publish_every: int
+        :raises OSError: if the directory can not be created or written to
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        if not os.access(directory, os.W_OK | os.X_OK):
+            raise PermissionError("Unable to write to {directory}".format(directory=directory))
+        MmapReport.directory = directory
+        if publish_every is not None:
+            MmapReport.publish_every = publish_every
+
+    def append(self, observation):
+        super(MmapReport, self).append(observation)
+        if next(self.__appends) % self.publish_every == 0:
+            self.__publish()
+
+    def disabled(self):
+        super(MmapReport, self).disabled()
+        if next(self.__appends) % self.publish_every == 0:
+            self.__publish()
+
+    # noinspection PyMethodMayBeStatic
+    def __publish(self):
+        # the periodic flush must not fail the caller's experiment
+        try:
+            MmapReport.flush()
+        except (OSError, ValueError):
+            MmapReport.failed_flushes += 1
+
+    @classmethod
+    def flush(cls):
+        """
+        Write the totals of all of this process's MmapReports to this process's file.
+        """
+        if MmapReport.directory is None:
+            raise ValueError("MmapReport.directory must be set")
+        aggregates = dict((report.description, report.aggregate()) for report in list(Report.reports.values())
+                          if isinstance(report, MmapReport))
+        _segment.write(MmapReport.directory, pack(aggregates))
+
+
+class _Segment(object):
+    # the memory mapped file of the current process
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.directory = None
+        self.file = None
+        self.map = None
+
+    def write(self, directory, payload):
+        with self.lock:
+            if self.pid != os.getpid() or self.directory != directory:
+                # first write or we are a forked child, so use a file of our own
+                self.__open(directory)
+            if HEADER.size + len(payload) > len(self.map):
+                self.__resize(HEADER.size + len(payload))
+            sequence = HEADER.unpack_from(self.map)[2] + 1
+            HEADER.pack_into(self.map, 0, MAGIC, VERSION, sequence, len(payload))
+            self.map[HEADER.size:HEADER.size + len(payload)] = payload
+            HEADER.pack_into(self.map, 0, MAGIC, VERSION, sequence + 1, len(payload))
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.file.close()
+            self.map = self.file = None
+            self.pid = None
+
+    def __open(self, directory):
+        # the directory changed or we are a forked child with the parent's file
+        self.close()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.pid = os.getpid()
+        self.directory = directory
+        path = os.path.join(directory, '{prefix}{pid}{suffix}'.format(prefix=FILE_PREFIX, pid=self.pid,
+                                                                      suffix=FILE_SUFFIX))
+        self.file = open(path, 'w+b')
+        self.file.truncate(mmap.PAGESIZE)
+        self.map = mmap.mmap(self.file.fileno(), mmap.PAGESIZE)
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, 0, 0)
+
+    def __resize(self, size):
+        pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+        self.file.truncate(pages * mmap.PAGESIZE)
+        self.map.resize(pages * mmap.PAGESIZE)
+
+
+_segment = _Segment()
+atexit.register(_segment.close)
+
+
+def _after_fork():
+    # the child's reports start with the parent's totals, which the parent publishes itself
+    _segment.lock = threading.Lock()
+    for report in list(Report.reports.values()):
+        if isinstance(report, MmapReport):
+            report.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def pack(aggregates):
+    """
+    Encode the totals of aggregates.
+
+    :param aggregates: the aggregates by description
+    :type aggregates: dict
+    :return: the encoded aggregates
+    :rtype: bytes
+    """
+    parts = [COUNT.pack(len(aggregates))]
+    for description, aggregate in aggregates.items():
+        parts.append(_pack_text(description))
+        parts.append(COUNTS.pack(aggregate.control_count, aggregate.enabled_count, aggregate.contrary_results))
+        parts.append(_pack_statuses(aggregate.statuses))
+        for name in Aggregate.merged_fields:
+            stats = getattr(aggregate, name)
+            if name.endswith('_histogram'):
+                parts.append(HISTOGRAM.pack(stats.significant_bits, stats.maximum, len(stats.counts)))
+                parts.extend(BUCKET.pack(index, count) for index, count in stats.counts.items())
+            else:
+                parts.append(STATS.pack(stats.count, stats.mean, stats.m2))
+        parts.append(_pack_deviation(aggregate.max_deviation))
+        parts.append(COUNT.pack(len(aggregate.candidates)))
+        for name, totals in aggregate.candidates.items():
+            parts.append(_pack_text(name))
+            parts.append(_pack_statuses(totals.statuses))
+            parts.append(STATS.pack(totals.times.count, totals.times.mean, totals.times.m2))
+            parts.append(_pack_deviation(totals.max_deviation))
+    return b''.join(parts)
+
+
+def unpack(payload):
+    """
+    Decode aggregates encoded by pack.
+
+    :param payload: the encoded aggregates
+    :type payload: bytes
+    :return: the aggregates by description
+    :rtype: dict
+    """
+    aggregates = {}
+    offset = 0
+    (report_count,), offset = COUNT.unpack_from(payload, offset), offset + COUNT.size
+    for _ in range(report_count):
+        description, offset = _unpack_text(payload, offset)
+        aggregate = Aggregate()
+        (aggregate.control_count, aggregate.enabled_count,
+         aggregate.contrary_results), offset = COUNTS.unpack_from(payload, offset), offset + COUNTS.size
+        offset = _unpack_statuses(payload, offset, aggregate.statuses)
+        for name in Aggregate.merged_fields:
+            stats = getattr(aggregate, name)
+            if name.endswith('_histogram'):
+                (stats.significant_bits, stats.maximum,
+                 bucket_count), offset = HISTOGRAM.unpack_from(payload, offset), offset + HISTOGRAM.size
+                for _ in range(bucket_count):
+                    (index, count), offset = BUCKET.unpack_from(payload, offset), offset + BUCKET.size
+                    stats.counts[index] = count
+                    stats.count += count
+            else:
+                (stats.count, stats.mean, stats.m2), offset = STATS.unpack_from(payload, offset), offset + STATS.size
+        aggregate.max_deviation, offset = _unpack_deviation(payload, offset)
+        (candidate_count,), offset = COUNT.unpack_from(payload, offset), offset + COUNT.size
+        for _ in range(candidate_count):
+            name, offset = _unpack_text(payload, offset)
+            totals = aggregate.candidates[name] = CandidateTotals()
+            offset = _unpack_statuses(payload, offset, totals.statuses)
+            times = totals.times
+            (times.count, times.mean, times.m2), offset = STATS.unpack_from(payload, offset), offset + STATS.size
+            totals.max_deviation, offset = _unpack_deviation(payload, offset)
+        aggregates[description] = aggregate
+    return aggregates
+
+
+def _pack_statuses(statuses):
+    parts = [COUNT.pack(len(statuses))]
+    for name, count in statuses.items():
+        parts.append(_pack_text(name))
+        parts.append(NUMBER.pack(count))
+    return b''.join(parts)
+
+
+def _unpack_statuses(payload, offset, statuses):
+    (status_count,), offset = COUNT.unpack_from(payload, offset), offset + COUNT.size
+    for _ in range(status_count):
+        name, offset = _unpack_text(payload, offset)
+        (statuses[name],), offset = NUMBER.unpack_from(payload, offset), offset + NUMBER.size
+    return offset
+
+
+def _pack_deviation(deviation):
+    return DEVIATION.pack(float('nan') if deviation is None else deviation)
+
+
+def _unpack_deviation(payload, offset):
+    (deviation,) = DEVIATION.unpack_from(payload, offset)
+    return None if math.isnan(deviation) else deviation, offset + DEVIATION.size
+
+
+def _pack_text(text):
+    data = text.encode('utf-8')
+    return LENGTH.pack(len(data)) + data
+
+
+def _unpack_text(payload, offset):
+    (length,) = LENGTH.unpack_from(payload, offset)
+    offset += LENGTH.size
+    return bytes(payload[offset:offset + length]).decode('utf-8'), offset + length
+
+
+def _read(path, retries=100):
+    # a seqlock read: retry while the writer is part way through (odd sequence) or wrote during our copy
+    with open(path, 'rb') as in_file:
+        size = os.fstat(in_file.fileno()).st_size
+        if size < HEADER.size:
+            return {}
+        with mmap.mmap(in_file.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+            for _ in range(retries):
+                magic, version, sequence, length = HEADER.unpack_from(mapped)
+                if magic != MAGIC or version != VERSION:
+                    return {}
+                if sequence % 2 or HEADER.size + length > size:
+                    continue
+                payload = mapped[HEADER.size:HEADER.size + length]
+                if HEADER.unpack_from(mapped)[2] == sequence:
+                    return unpack(payload)
+    return {}
+
+
+def collect(directory):
+    """
+    Merge the totals written by every process.
+
+    :param directory: the MmapReport.directory the processes wrote to
+    :type directory: str
+    :return: the merged aggregates by description
+    :rtype: dict
+    """
+    merged = {}
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)):
+            continue
+        for description, aggregate in _read(os.path.join(directory, name)).items():
+            merged.setdefault(description, Aggregate()).merge(aggregate)
+    return merged
+
+
+def collected_summary(directory):
+    """
+    :param directory: the MmapReport.directory the processes wrote to
+    :type directory: str
+    :return: a report string for all of the processes' reports
+    :rtype: str
+    """
+    parts = []
+    for description, aggregate in sorted(collect(directory).items()):
+        report = MergedReport(description, aggregate)
+        report.summarize()
+        parts.append(str(report))
+        parts.append(Report.report_divider)
+    return "\n".join(parts)
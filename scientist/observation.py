@@ -0,0 +1,124 @@
+# coding=utf-8
+
+"""
+The compact record of an experiment's outcome that is handed to the reports.
+"""
+import time
+from collections import namedtuple
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('Observation', 'CandidateObservation', 'Mismatch')
+
+
+class Observation(namedtuple('Observation', ['description', 'status', 'is_enabled', 'control_elapsed_ns',
+                                             'trial_elapsed_ns', 'control_cpu_ns', 'trial_cpu_ns',
+                                             'control_peak_memory', 'trial_peak_memory', 'control_exception',
+                                             'trial_exception', 'control_digest', 'trial_digest', 'deviation',
+                                             'timestamp', 'mismatch', 'candidates', 'count'],
+                                 defaults=(1,))):
+    """
+    The outcome of one perform.  Unlike the experiment, an observation does not hold on to the perform's
+    context, the functions or (unless the results were contrary) their values, and exceptions are recorded by
+    their type name so their tracebacks are not kept alive.
+
+    The digests are only set when the experiment has a digest function or compared the values by fingerprint.
+    deviation is only set when the experiment's comparator measured it.  mismatch is only set for contrite
+    experiments.  candidates is a tuple of CandidateObservations when the experiment has candidates.  count is
+    the number of calls observed, which is only more than 1 for the disabled observations a Publisher sends
+    for the calls it counted.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_experiment(cls, experiment):
+        """
+        :param experiment: the completed experiment instance
+        :type experiment: Experiment
+        :return: the experiment's observation
+        :rtype: Observation
+        """
+        control = experiment.control
+        trial = experiment.trial
+        mismatch = None
+        if experiment.status == 'contrite':
+            mismatch = Mismatch(control, experiment.contrary_runner or trial, experiment.divergence)
+        candidates = None
+        if experiment.candidates:
+            candidates = tuple(CandidateObservation.from_candidate(candidate) for candidate in experiment.candidates)
+        return cls(experiment.description, experiment.status, experiment.is_enabled, control.elapsed_ns,
+                   trial.elapsed_ns, control.cpu_ns, trial.cpu_ns, control.peak_memory, trial.peak_memory,
+                   _exception_name(control.exception), _exception_name(trial.exception),
+                   _digest(experiment.digest, control), _digest(experiment.digest, trial), experiment.deviation,
+                   time.time(), mismatch, candidates)
+
+    @classmethod
+    def disabled(cls, description, count=1):
+        """
+        :param description: the experiment's description
+        :type description: str
+        :param count: the number of calls
+        :type count: int
+        :return: the observation of calls of a disabled experiment
+        :rtype: Observation
+        """
+        return cls(description, 'disabled', False, None, None, None, None, None, None, None, None, None, None, None,
+                   time.time(), None, None, count)
+
+    def as_dict(self):
+        """
+        :return: the observation without the mismatch, ex: for serializing
+        :rtype: dict
+        """
+        values = self._asdict()
+        del values['mismatch']
+        if self.candidates is not None:
+            values['candidates'] = [candidate._asdict() for candidate in self.candidates]
+        return dict(values)
+
+
+class CandidateObservation(namedtuple('CandidateObservation', ['name', 'status', 'elapsed_ns', 'cpu_ns',
+                                                               'exception', 'deviation'])):
+    """
+    The outcome of one of a multi candidate experiment's candidates.  The times are None if the candidate
+    did not finish.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_candidate(cls, candidate):
+        """
+        :param candidate: the candidate's runner
+        :type candidate: scientist.experiment.Candidate
+        :return: the candidate's observation
+        :rtype: CandidateObservation
+        """
+        return cls(candidate.name, candidate.status, candidate.elapsed_ns, candidate.cpu_ns,
+                   _exception_name(candidate.exception), candidate.deviation)
+
+
+class Mismatch(object):
+    """
+    The control and trial runners of a contrite experiment, kept so the report can show their values.  When
+    the experiment has candidates, trial is the trial or candidate that did not match.
+    """
+    __slots__ = ('control', 'trial', 'divergence')
+
+    def __init__(self, control, trial, divergence):
+        self.control = control
+        self.trial = trial
+        self.divergence = divergence
+
+
+def _exception_name(exception):
+    if exception is None:
+        return None
+    return type(exception).__name__
+
+
+def _digest(digest, runner):
+    if runner.digest is not None:
+        # already computed by the comparator
+        return runner.digest
+    if digest is None or runner.elapsed_ns is None or runner.exception is not None:
+        return None
+    return digest(runner.value)
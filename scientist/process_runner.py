@@ -0,0 +1,308 @@
+# coding=utf-8
+
+"""
+Run trials in a pool of worker processes so CPU bound trials don't compete with the control for the GIL
+and a runaway trial can not take down the serving process.
+
+The workers are started when the pool is created.  Each call may be limited to cpu_seconds of CPU time
+(RLIMIT_CPU, rounded up to whole seconds) and each worker to memory_bytes of address space (RLIMIT_AS,
+so going over it raises MemoryError in the trial).  A call that has not returned within timeout seconds
+has it's worker killed.  A killed worker, or one that died (ex: a segfault), is replaced and the
+experiment is reported with a 'killed' or 'crashed' status.
+
+The functions, kwargs and results are pickled to and from the workers, so the functions must be module
+level functions.  The limits are only enforced where the resource module is available.
+
+Large kwargs are not copied through the pipe.  They are pickled with protocol 5 out-of-band buffers that
+are copied once into a shared memory segment kept for each worker, and the worker unpickles them from
+views of the segment.  numpy arrays (anywhere in the kwargs) are used in place, while bytes and bytearray
+kwargs are copied once more to rebuild them.  Buffers smaller than shared_bytes stay inline.
+
+Usage::
+
+    pool = ProcessPool(workers=2, cpu_seconds=1, memory_bytes=512 * 1024 * 1024, timeout=5)
+    with Scientist('cpu bound rewrite') as experiment:
+        experiment.trial = ProcessRunner(pool)
+        experiment.control.function = original
+        experiment.trial.function = rewrite
+        experiment.perform(order=order)
+
+"""
+import math
+import multiprocessing
+import pickle
+import queue
+import signal
+import threading
+from collections import namedtuple
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # python < 3.8, the kwargs are always sent inline
+    resource_tracker = shared_memory = None
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+from scientist.experiment import Runner, perf_counter_ns, process_time_ns
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('ProcessPool', 'ProcessRunner', 'ProcessResult')
+
+ProcessResult = namedtuple('ProcessResult', ['value', 'exception', 'elapsed_ns', 'cpu_ns', 'outcome'])
+
+# the signals a worker is killed with when it goes over it's CPU time or is killed for taking too long
+KILL_SIGNALS = tuple(getattr(signal, name) for name in ('SIGKILL', 'SIGXCPU') if hasattr(signal, name))
+
+
+class ProcessRunner(Runner):
+    """
+    A Runner that calls it's function in one of a ProcessPool's workers.  elapsed_ns and cpu_ns are
+    measured in the worker.  outcome is 'killed' or 'crashed' (and there are no times) when the worker did
+    not return a result.
+    """
+
+    def __init__(self, pool):
+        """
+        :param pool: the pool to run the function in
+        :type pool: ProcessPool
+        """
+        super(ProcessRunner, self).__init__()
+        self.pool = pool
+
+    def execute(self, clean, **kwargs):
+        self.prepare(clean)
+        self.value, self.exception, self.elapsed_ns, self.cpu_ns, self.outcome = self.pool.call(self.function, kwargs)
+
+
+class ProcessPool(object):
+    """
+    A fixed number of pre-started worker processes, each running one call at a time.  Calls wait for an
+    idle worker.
+
+    Create the pool in the process that uses it, ex: in each worker of a pre-fork server, rather than
+    sharing one pool across a fork.
+    """
+
+    def __init__(self, workers=1, cpu_seconds=None, memory_bytes=None, timeout=None, initializer=None,
+                 context=None, shared_bytes=64 * 1024):
+        """
+        :param workers: the number of worker processes
+        :type workers: int
+        :param cpu_seconds: the most CPU time a call may use, None for no limit
+        :type cpu_seconds: float
+        :param memory_bytes: the most address space a worker may use, None for no limit
+        :type memory_bytes: int
+        :param timeout: the most seconds a call may take before it's worker is killed, None to wait
+        :type timeout: float
+        :param initializer: called without arguments when a worker starts, ex: to import the trial's modules
+        :type initializer: callable
+        :param context: the multiprocessing context used to start the workers, defaults to the default context
+        :param shared_bytes: the size from which a kwargs buffer is sent through shared memory, None to send
+                             everything inline
+        :type shared_bytes: int
+        """
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.timeout = timeout
+        self.initializer = initializer
+        self.context = context or multiprocessing.get_context()
+        self.shared_bytes = shared_bytes if shared_memory is not None else None
+        self.killed = 0
+        self.crashed = 0
+        self.__lock = threading.Lock()
+        self.__idle = queue.Queue()
+        self.__workers = []
+        for _ in range(workers):
+            self.__idle.put(self.__start())
+
+    def call(self, function, kwargs):
+        """
+        Call a function in a worker.
+
+        :param function: the function to call
+        :type function: callable
+        :param kwargs: the kwargs to call it with
+        :type kwargs: dict
+        :return: the outcome of the call
+        :rtype: ProcessResult
+        """
+        worker = self.__idle.get()
+        process, connection = worker.process, worker.connection
+        start_ns = perf_counter_ns()
+        try:
+            connection.send_bytes(self.__message(worker, function, kwargs))
+            if connection.poll(self.timeout):
+                result = connection.recv()
+                self.__idle.put(worker)
+                return ProcessResult(*(result + (None,)))
+            process.kill()
+            outcome = 'killed'
+        except (EOFError, OSError):
+            process.join()
+            outcome = 'killed' if -process.exitcode in KILL_SIGNALS else 'crashed'
+        except Exception as ex:
+            # the function or kwargs could not be pickled, so the worker never saw the call
+            self.__idle.put(worker)
+            return ProcessResult(None, ex, perf_counter_ns() - start_ns, 0, None)
+
+        process.join()
+        worker.close()
+        with self.__lock:
+            self.__workers.remove(worker)
+            if outcome == 'killed':
+                self.killed += 1
+            else:
+                self.crashed += 1
+        self.__idle.put(self.__start())
+        return ProcessResult(None, None, None, None, outcome)
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        with self.__lock:
+            workers, self.__workers = self.__workers, []
+        for worker in workers:
+            worker.connection.close()
+            worker.process.join(1)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.close()
+
+    def __message(self, worker, function, kwargs):
+        # the pickled call.  Out-of-band buffers are copied into the worker's segment and only their spans
+        # are sent.
+        call = (function, kwargs, self.cpu_seconds)
+        if self.shared_bytes is None:
+            return pickle.dumps((None, (), pickle.dumps(call, pickle.HIGHEST_PROTOCOL)), pickle.HIGHEST_PROTOCOL)
+        buffers = []
+        kwargs = dict((key, _OutOfBand(value) if isinstance(value, (bytes, bytearray)) and
+                       len(value) >= self.shared_bytes else value) for key, value in kwargs.items())
+        # a buffer is pickled inline when the callback returns true
+        payload = pickle.dumps((function, kwargs, self.cpu_seconds), 5, buffer_callback=lambda buffer: (
+            buffer.raw().nbytes < self.shared_bytes or buffers.append(buffer.raw())))
+        if not buffers:
+            return pickle.dumps((None, (), payload), 5)
+        size = sum(buffer.nbytes for buffer in buffers)
+        segment = worker.segment(size)
+        spans = []
+        offset = 0
+        for buffer in buffers:
+            segment.buf[offset:offset + buffer.nbytes] = buffer
+            spans.append((offset, buffer.nbytes))
+            offset += buffer.nbytes
+        return pickle.dumps((segment.name, spans, payload), 5)
+
+    def __start(self):
+        parent_connection, child_connection = self.context.Pipe()
+        process = self.context.Process(target=_work, args=(child_connection, self.memory_bytes, self.initializer),
+                                       name='scientist-trial')
+        process.daemon = True
+        process.start()
+        child_connection.close()
+        worker = _Worker(process, parent_connection)
+        with self.__lock:
+            self.__workers.append(worker)
+        return worker
+
+
+class _Worker(object):
+    # a worker process, the parent's end of it's pipe and the shared memory segment it's kwargs are sent in
+    def __init__(self, process, connection):
+        self.process = process
+        self.connection = connection
+        self.__segment = None
+
+    def segment(self, size):
+        # the segment, grown to at least size bytes.  A worker has one call at a time, so it is reused.
+        if self.__segment is None or self.__segment.size < size:
+            self.close_segment()
+            # grow by at least half so slowly growing kwargs don't create a segment every call
+            size = max(size, self.__segment.size * 3 // 2 if self.__segment is not None else 0)
+            self.__segment = shared_memory.SharedMemory(create=True, size=size)
+        return self.__segment
+
+    def close_segment(self):
+        if self.__segment is not None:
+            self.__segment.close()
+            self.__segment.unlink()
+
+    def close(self):
+        self.connection.close()
+        self.close_segment()
+        self.__segment = None
+
+
+class _OutOfBand(object):
+    # pickles a bytes or bytearray value as an out-of-band buffer, which pickle only does for PickleBuffers
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __reduce_ex__(self, protocol):
+        return _rebuild, (type(self.value), pickle.PickleBuffer(self.value))
+
+
+def _rebuild(kind, buffer):
+    # the buffer is a view of the segment, so copy it before the segment is reused
+    return kind(buffer)
+
+
+def _attach(name):
+    # attach a segment the parent created and owns, so this process's resource tracker must not unlink it
+    segment = shared_memory.SharedMemory(name=name)
+    if resource_tracker is not None and hasattr(resource_tracker, 'unregister'):
+        # noinspection PyProtectedMember
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
+
+
+def _work(connection, memory_bytes, initializer):
+    # the worker process's loop
+    if resource is not None and memory_bytes is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    initializer is not None and initializer()
+    segment = None
+    while True:
+        try:
+            name, spans, payload = pickle.loads(connection.recv_bytes())
+        except (EOFError, OSError):
+            return
+        if name is not None and (segment is None or segment.name != name):
+            # the parent grew the segment
+            segment = _attach(name)
+        start_ns = perf_counter_ns()
+        start_cpu_ns = process_time_ns()
+        value = exception = None
+        function = kwargs = None
+        try:
+            if spans:
+                function, kwargs, cpu_seconds = pickle.loads(payload, buffers=[segment.buf[offset:offset + length]
+                                                                               for offset, length in spans])
+            else:
+                function, kwargs, cpu_seconds = pickle.loads(payload)
+            if resource is not None and cpu_seconds is not None:
+                # RLIMIT_CPU limits the process's total CPU time, so allow this call cpu_seconds more
+                usage = resource.getrusage(resource.RUSAGE_SELF)
+                limit = int(math.ceil(usage.ru_utime + usage.ru_stime + cpu_seconds))
+                resource.setrlimit(resource.RLIMIT_CPU, (limit, resource.getrlimit(resource.RLIMIT_CPU)[1]))
+            value = function(**kwargs)
+        except Exception as ex:
+            exception = ex
+        elapsed_ns = perf_counter_ns() - start_ns
+        cpu_ns = process_time_ns() - start_cpu_ns
+        # drop the views of the segment before the parent overwrites it
+        del function, kwargs
+        try:
+            connection.send((value, exception, elapsed_ns, cpu_ns))
+        except Exception as ex:
+            # the result could not be pickled
+            connection.send((None, RuntimeError("Unable to return the trial's result: {error!r}".format(error=ex)),
+                             elapsed_ns, cpu_ns))
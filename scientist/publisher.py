@@ -0,0 +1,290 @@
+# coding=utf-8
+
+"""
+Publish experiment results in batches from a background thread.
+
+A Publisher can be used in place of a Report class.  It appends each experiment's Observation (a small
+immutable record) to a bounded buffer and returns, so the only cost on the caller's thread is one append.  A worker
+thread wakes up when batch_size records are waiting or flush_interval seconds have passed and hands the
+observations to it's sinks in batches of at most batch_size.
+
+Calls of disabled experiments are only counted, by the calling thread, and each time the worker wakes up it
+publishes one disabled observation per experiment description whose count is the number of calls since the
+last one.
+
+Usage::
+
+    Scientist.report = Publisher([FileSink('/var/log/myapp/scientist.jsonl')], batch_size=500, flush_interval=5)
+
+"""
+import functools
+import json
+import os
+import socket
+import threading
+from collections import deque
+
+from scientist.observation import Observation
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('Publisher', 'Sink', 'CallbackSink', 'FileSink', 'SocketSink')
+
+
+class Sink(object):
+    """
+    Base class for sinks.  Child classes should override the write method.
+    """
+
+    def write(self, records):
+        """
+        :param records: a batch of observations
+        :type records: list[Observation]
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class CallbackSink(Sink):
+    """
+    Calls a function with each batch of records.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, records):
+        self.callback(records)
+
+
+class FileSink(Sink):
+    """
+    Appends records to a file as JSON lines.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__file = None
+
+    def write(self, records):
+        if self.__file is None:
+            self.__file = open(self.path, 'a')
+        self.__file.write(''.join(json.dumps(record.as_dict()) + '\n' for record in records))
+        self.__file.flush()
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+
+class SocketSink(Sink):
+    """
+    Sends records as JSON lines in datagrams of at most max_datagram bytes to a unix domain socket (when the
+    address is a path) or a UDP address (when the address is a (host, port) tuple).
+    """
+    max_datagram = 8192
+
+    def __init__(self, address):
+        self.address = address
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.__socket = socket.socket(family, socket.SOCK_DGRAM)
+
+    def write(self, records):
+        datagram = b''
+        for record in records:
+            line = (json.dumps(record.as_dict()) + '\n').encode('utf-8')
+            if datagram and len(datagram) + len(line) > self.max_datagram:
+                self.__socket.sendto(datagram, self.address)
+                datagram = b''
+            datagram += line
+        if datagram:
+            self.__socket.sendto(datagram, self.address)
+
+    def close(self):
+        self.__socket.close()
+
+
+class Publisher(object):
+    """
+    Collects experiment observations and writes them to sinks in batches on a background thread.
+
+    When more than max_pending records are waiting, new records are dropped (and counted in dropped) instead
+    of letting the buffer grow.  The counts of disabled calls are never dropped.
+    """
+
+    def __init__(self, sinks, batch_size=100, flush_interval=1.0, max_pending=10000):
+        """
+        :param sinks: where to write the records
+        :type sinks: list[Sink]
+        :param batch_size: the most records handed to a sink at once
+        :type batch_size: int
+        :param flush_interval: the longest a record waits before being written, in seconds
+        :type flush_interval: float
+        :param max_pending: the most records waiting to be written
+        :type max_pending: int
+        """
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        # appending to and popping from a deque are atomic so the callers never take a lock
+        self.__pending = deque()
+        self.__ready = threading.Event()
+        self.__lock = threading.Lock()
+        self.__thread = None
+        self.__pid = None
+        self.__closed = False
+        # each thread's counts of disabled calls
+        self.__local = threading.local()
+        self.__counters = []
+
+    def add(self, observation):
+        """
+        Queue an experiment's observation to be published.
+
+        :param observation: the outcome of a completed experiment
+        :type observation: Observation
+        """
+        if self.__pid != os.getpid():
+            self.__start()
+        if len(self.__pending) >= self.max_pending:
+            with self.__lock:
+                self.dropped += 1
+            return
+        self.__pending.append(observation)
+        if len(self.__pending) >= self.batch_size:
+            self.__ready.set()
+
+    def disabled_counter(self, description):
+        """
+        :param description: the experiment's description
+        :type description: str
+        :return: a function without arguments that counts a call of a disabled experiment with the description
+        :rtype: callable
+        """
+        return functools.partial(self.disabled, description)
+
+    def disabled(self, description):
+        """
+        Count a call of a disabled experiment.  The worker publishes the counts rather than an observation per
+        call.
+
+        :param description: the experiment's description
+        :type description: str
+        """
+        if self.__pid != os.getpid():
+            self.__start()
+        counter = getattr(self.__local, 'counter', None)
+        if counter is None:
+            counter = self.__local.counter = _Counter()
+            with self.__lock:
+                self.__counters.append(counter)
+        counter.counts[description] = counter.counts.get(description, 0) + 1
+
+    def flush(self, timeout=None):
+        """
+        Block until the records queued so far have been written.
+
+        :param timeout: the most seconds to wait, None to wait until done
+        :type timeout: float
+        :return: asserted if the records were written
+        :rtype: bool
+        """
+        if self.__thread is None:
+            return True
+        # the worker sets the marker when it reaches it, after writing everything queued before it
+        marker = threading.Event()
+        self.__pending.append(marker)
+        self.__ready.set()
+        return marker.wait(timeout)
+
+    def close(self):
+        """
+        Write any queued records, stop the worker thread and close the sinks.
+        """
+        self.flush()
+        self.__closed = True
+        self.__ready.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        for sink in self.sinks:
+            sink.close()
+
+    def __start(self):
+        with self.__lock:
+            if self.__pid == os.getpid():
+                return
+            # either the first add or we are a forked child without the parent's worker thread
+            if self.__pid is not None:
+                # the parent publishes the calls it counted
+                for counter in self.__counters:
+                    counter.published = dict(counter.counts)
+            self.__pid = os.getpid()
+            self.__thread = threading.Thread(target=self.__work, name='scientist-publisher')
+            self.__thread.daemon = True
+            self.__thread.start()
+
+    def __work(self):
+        while not self.__closed:
+            self.__ready.wait(self.flush_interval)
+            self.__ready.clear()
+            batch = self.__counted()
+            while self.__pending:
+                item = self.__pending.popleft()
+                if isinstance(item, Observation):
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        self.__write(batch)
+                        batch = []
+                else:
+                    # a flush marker, the calls counted before it are written with it
+                    batch.extend(self.__counted())
+                    batch and self.__write(batch)
+                    batch = []
+                    item.set()
+            batch and self.__write(batch)
+
+    def __counted(self):
+        # a disabled observation per description for the calls counted since the last time
+        totals = {}
+        with self.__lock:
+            counters = list(self.__counters)
+        for counter in counters:
+            # once it's thread has exited a counter's counts can not change
+            alive = counter.thread.is_alive()
+            for description, count in list(counter.counts.items()):
+                published = counter.published.get(description, 0)
+                if count > published:
+                    counter.published[description] = count
+                    totals[description] = totals.get(description, 0) + count - published
+            if not alive:
+                with self.__lock:
+                    self.__counters.remove(counter)
+        return [Observation.disabled(description, count) for description, count in totals.items()]
+
+    def __write(self, batch):
+        for start in range(0, len(batch), self.batch_size):
+            self.__write_batch(batch[start:start + self.batch_size])
+
+    def __write_batch(self, batch):
+        for sink in self.sinks:
+            try:
+                sink.write(batch)
+            except Exception as ex:
+                # a failing sink must never take down the worker thread
+                print("Publishing to {sink} failed: {error}".format(sink=type(sink).__name__, error=repr(ex)))
+
+
+class _Counter(object):
+    # one thread's counts of disabled calls by description.  Only the owning thread changes counts, the worker
+    # thread keeps how many of them it has published.
+    __slots__ = ('thread', 'counts', 'published')
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.counts = {}
+        self.published = {}
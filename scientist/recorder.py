@@ -0,0 +1,303 @@
+# coding=utf-8
+
+"""
+Record a sample of an experiment's production inputs and control results, then replay them offline through
+a new trial function.
+
+A Recorder appends the sampled perform kwargs along with the control's value (or exception) and timings to
+a compact binary log: a short header followed by length prefixed pickles.  Appends are a single unbuffered
+write so a crash loses at most the record being written, which readers skip.  When the log would grow past
+max_bytes it is rotated like logging.handlers.RotatingFileHandler (path.1 is the newest old log).
+
+Logs are read through a memory map and replayed in parallel by splitting them into chunks of records, so
+the worker processes read the records themselves instead of having them sent over pipes.
+
+Note the logs are pickles, so only replay logs you wrote.
+
+Usage::
+
+    # in production
+    experiment.recorder = Recorder('/var/log/myapp/orders-{pid}.rec'.format(pid=os.getpid()), percent=0.1)
+
+    # offline
+    for report in replay(log_paths('/var/log/myapp/orders-1234.rec'), new_total).values():
+        print(report)
+
+"""
+import mmap
+import multiprocessing
+import os
+import pickle
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from scientist.experiment import Experiment
+from scientist.in_memory_report import Aggregate, MergedReport
+from scientist.sampler import RateSampler
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('Recorder', 'Recording', 'read_log', 'log_paths', 'replay')
+
+MAGIC = b'SCIR'
+VERSION = 1
+HEADER = struct.Struct('<4sH')
+FRAME = struct.Struct('<I')
+
+Recording = namedtuple('Recording', ['description', 'context', 'value', 'exception', 'elapsed_ns', 'cpu_ns',
+                                     'timestamp'])
+
+
+class Recorder(object):
+    """
+    Appends a sample of an experiment's calls to a log.  Set an experiment's recorder to use it.
+
+    Only one process should write to a given path, ex: put the process id in the path of a pre-fork
+    server's workers.  Calls whose context or control value can not be pickled, or that could not be written
+    to the log (ex: the disk is full), are counted in failed.
+    """
+
+    def __init__(self, path, percent=1.0, sampler=None, max_bytes=64 * 1024 * 1024, backups=5,
+                 protocol=pickle.HIGHEST_PROTOCOL):
+        """
+        :param path: the log file
+        :type path: str
+        :param percent: the percent of calls to record
+        :type percent: float
+        :param sampler: decides which calls to record instead of percent, ex: a HashSampler
+        :type sampler: scientist.sampler.Sampler
+        :param max_bytes: the size the log is rotated at
+        :type max_bytes: int
+        :param backups: the number of rotated logs kept
+        :type backups: int
+        :param protocol: the pickle protocol
+        :type protocol: int
+        """
+        self.path = path
+        self.sampler = sampler or RateSampler(percent)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.protocol = protocol
+        self.recorded = 0
+        self.failed = 0
+        self.__lock = threading.Lock()
+        self.__file = None
+        self.__size = 0
+        self.__pid = None
+
+    def record(self, description, context, control):
+        """
+        Append the call to the log if it is sampled.
+
+        :param description: the experiment's description
+        :type description: str
+        :param context: the merged context the control was called with
+        :type context: dict
+        :param control: the control's runner after it was executed
+        :type control: scientist.experiment.Runner
+        :return: asserted if the call was recorded
+        :rtype: bool
+        """
+        if not self.sampler.sample(context):
+            return False
+        try:
+            payload = pickle.dumps((description, context, control.value, control.exception, control.elapsed_ns,
+                                    control.cpu_ns, time.time()), self.protocol)
+        except Exception:
+            with self.__lock:
+                self.failed += 1
+            return False
+        frame = FRAME.pack(len(payload)) + payload
+        with self.__lock:
+            try:
+                if self.__pid != os.getpid():
+                    # first record or we are a forked child that must not share the parent's file object
+                    self.__open()
+                if self.__size > HEADER.size and self.__size + len(frame) > self.max_bytes:
+                    self.__rotate()
+                self.__write(frame)
+            except OSError:
+                # the caller's request must not fail because the log could not be written
+                self.failed += 1
+                self.__abandon()
+                return False
+            self.recorded += 1
+        return True
+
+    def close(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+                self.__pid = None
+
+    def __open(self):
+        self.__file = open(self.path, 'ab', buffering=0)
+        self.__size = self.__file.seek(0, os.SEEK_END)
+        if self.__size == 0:
+            self.__write(HEADER.pack(MAGIC, VERSION))
+        self.__pid = os.getpid()
+
+    def __write(self, data):
+        # an unbuffered write may write less than asked, so write the rest.  If it fails part way, the
+        # partial record is truncated so it is not followed by complete records.
+        view = memoryview(data)
+        written = 0
+        try:
+            while written < len(data):
+                count = self.__file.write(view[written:])
+                if not count:
+                    raise OSError("Unable to write to {path}".format(path=self.path))
+                written += count
+        except OSError:
+            if written:
+                self.__file.truncate(self.__size)
+            raise
+        self.__size += len(data)
+
+    def __abandon(self):
+        # close the log after a failure so the next record opens it again
+        if self.__file is not None:
+            try:
+                self.__file.close()
+            except OSError:
+                pass
+        self.__file = None
+        self.__pid = None
+
+    def __rotate(self):
+        self.__file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = '{path}.{index}'.format(path=self.path, index=index)
+            if os.path.exists(source):
+                os.replace(source, '{path}.{index}'.format(path=self.path, index=index + 1))
+        if self.backups:
+            os.replace(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+        self.__open()
+
+
+def log_paths(path):
+    """
+    :param path: the path a Recorder wrote to
+    :type path: str
+    :return: the paths of the log and it's existing rotated logs, oldest first
+    :rtype: list[str]
+    """
+    index = 1
+    while os.path.exists('{path}.{index}'.format(path=path, index=index)):
+        index += 1
+    paths = ['{path}.{index}'.format(path=path, index=old) for old in range(index - 1, 0, -1)]
+    if os.path.exists(path):
+        paths.append(path)
+    return paths
+
+
+def read_log(path, start=None, end=None):
+    """
+    Read the recordings in a log.  A partly written last record is skipped.
+
+    :param path: the log file
+    :type path: str
+    :param start: the offset of the first record to read, defaults to the first record
+    :type start: int
+    :param end: read the records starting before this offset, defaults to the end of the log
+    :type end: int
+    :return: the recordings
+    :rtype: collections.Iterable[Recording]
+    """
+    for _, payload in _frames(path, start, end):
+        yield Recording(*pickle.loads(payload))
+
+
+def _frames(path, start=None, end=None, payloads=True):
+    # yields the offset and (when payloads is asserted) the payload of each record
+    with open(path, 'rb') as in_file:
+        size = os.fstat(in_file.fileno()).st_size
+        if size < HEADER.size:
+            return
+        with mmap.mmap(in_file.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+            if HEADER.unpack_from(mapped) != (MAGIC, VERSION):
+                raise ValueError("{path} is not a scientist recording".format(path=path))
+            offset = HEADER.size if start is None else start
+            end = size if end is None else min(end, size)
+            while offset + FRAME.size <= end:
+                (length,) = FRAME.unpack_from(mapped, offset)
+                if offset + FRAME.size + length > size:
+                    break
+                yield offset, payloads and mapped[offset + FRAME.size:offset + FRAME.size + length]
+                offset += FRAME.size + length
+
+
+def replay(paths, trial, comparator=None, description=None, processes=None, chunk_size=1000):
+    """
+    Run a trial function against the recorded control results in parallel worker processes.
+
+    The trial and comparator are pickled to the workers, so they must be module level functions.
+
+    :param paths: the logs to replay, ex: from log_paths
+    :type paths: list[str]
+    :param trial: the function to call with each recording's context
+    :type trial: callable
+    :param comparator: compares the recorded control value and the trial's value, defaults to ==
+    :type comparator: callable
+    :param description: only replay the recordings of this experiment, defaults to all of them
+    :type description: str
+    :param processes: the number of worker processes, defaults to the number of CPUs
+    :type processes: int
+    :param chunk_size: the number of recordings each worker replays at a time
+    :type chunk_size: int
+    :return: the summarized reports by experiment description
+    :rtype: dict
+    """
+    chunks = []
+    for path in paths:
+        offsets = [offset for offset, _ in _frames(path, payloads=False)]
+        for index in range(0, len(offsets), chunk_size):
+            end = offsets[index + chunk_size] if index + chunk_size < len(offsets) else None
+            chunks.append((path, offsets[index], end, trial, comparator, description))
+
+    merged = {}
+    pool = multiprocessing.Pool(processes)
+    try:
+        for aggregates in pool.imap_unordered(_replay_chunk, chunks):
+            for name, aggregate in aggregates.items():
+                merged.setdefault(name, Aggregate()).merge(aggregate)
+    finally:
+        pool.close()
+        pool.join()
+
+    reports = {}
+    for name, aggregate in merged.items():
+        reports[name] = MergedReport(name, aggregate)
+        reports[name].summarize()
+    return reports
+
+
+class _Aggregates(dict):
+    # the report of the experiments replayed by a worker, one Aggregate per description
+    def add(self, observation):
+        if observation.description not in self:
+            self[observation.description] = Aggregate()
+        self[observation.description].append(observation)
+
+
+def _replay_chunk(args):
+    path, start, end, trial, comparator, description = args
+    aggregates = _Aggregates()
+    for recording in read_log(path, start, end):
+        if description is not None and recording.description != description:
+            continue
+        experiment = Experiment(recording.description, report=aggregates)
+        if comparator is not None:
+            experiment.comparator = comparator
+        experiment.is_enabled = True
+        control = experiment.control
+        control.value, control.exception = recording.value, recording.exception
+        control.elapsed_ns, control.cpu_ns = recording.elapsed_ns, recording.cpu_ns
+        experiment.trial.function = trial
+        experiment.trial.execute(clean=None, **recording.context)
+        experiment.conclude(recording.context)
+    return dict(aggregates)
@@ -3,8 +3,11 @@
 """
 Base class for reports that just provides the interface child classes should use.
 """
+import threading
 from textwrap import dedent
 
+from scientist.observation import Observation
+
 __docformat__ = 'restructuredtext en'
 __all__ = ('Report',)
 
@@ -14,6 +17,8 @@ class Report(object):
     # value.
     reports = {}
     report_divider = "-" * 78
+    # guards adding reports.  Looking up an existing report does not take the lock.
+    reports_lock = threading.Lock()
 
     def __init__(self, description):
         self.description = description
@@ -37,10 +42,9 @@ class Report(object):
         :rtype: str
         """
         parts = []
-        for description in Report.reports.keys():
-            report = Report.reports[description]
+        for report in list(Report.reports.values()):
             report.summarize()
-            parts.append(report)
+            parts.append(str(report))
             parts.append(Report.report_divider)
         return "\n".join(parts)
 
@@ -57,30 +61,52 @@ class Report(object):
         if description is None:
             raise ValueError("The description must not be None")
 
-        if description not in Report.reports.keys():
-            Report.reports[description] = cls(description)
-        return Report.reports[description]
+        report = Report.reports.get(description)
+        if report is None:
+            with Report.reports_lock:
+                report = Report.reports.get(description)
+                if report is None:
+                    report = Report.reports[description] = cls(description)
+        return report
 
     @classmethod
-    def add(cls, experiment):
+    def add(cls, observation):
+        """
+        Add an experiment's observation to the report instance with the same description as the experiment.
+
+        :param observation: the outcome of a completed experiment
+        :type observation: Observation
         """
-        Add an experiment instance to it's the report instance with the same description as the experiment.
+        report = cls.get(observation.description)
+        report.append(observation)
 
-        :param experiment: the completed experiment instance
-        :type experiment: Experiment
+    @classmethod
+    def disabled_counter(cls, description):
+        """
+        :param description: the experiment's description
+        :type description: str
+        :return: a function without arguments that counts a call of a disabled experiment in the report
+                 instance with the experiment's description
+        :rtype: callable
+        """
+        return cls.get(description).disabled
+
+    def disabled(self):
+        """
+        Count a call of a disabled experiment.  Child classes that aggregate should override this to just
+        increment their counts.
         """
-        report = cls.get(experiment.description)
-        report.append(experiment)
+        self.append(Observation.disabled(self.description))
 
-    def append(self, experiment):
+    def append(self, observation):
         """
-        Append an experiment instance to this report's list of experiments.
+        Append an experiment's observation to this report.
 
-        :param experiment: the completed experiment instance
-        :type experiment: Experiment
+        :param observation: the outcome of a completed experiment
+        :type observation: Observation
         """
         # should be something like:
-        # self.experiments.append(experiment)
+        # self.observations.append(observation)
         raise NotImplementedError()
 
     def summarize(self):
@@ -0,0 +1,192 @@
+# coding=utf-8
+
+"""
+Samplers decide whether an experiment's trial is run for a given call.
+
+Rates are given as a percent of calls and may be fractional (ex: 0.001 for one call in 100,000).
+
+Usage::
+
+    # run the trial for 0.5% of the users, always the same users
+    Scientist.sampler = HashSampler(0.5, key='user')
+
+"""
+import hashlib
+import random
+import struct
+import threading
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('Sampler', 'RateSampler', 'HashSampler', 'AdaptiveSampler', 'thread_random')
+
+_local = threading.local()
+
+
+def thread_random():
+    """
+    :return: a random number generator private to the calling thread, so threads do not contend on the
+             random module's shared generator
+    :rtype: random.Random
+    """
+    generator = getattr(_local, 'random', None)
+    if generator is None:
+        generator = _local.random = random.Random()
+    return generator
+
+
+class Sampler(object):
+    """
+    Base class for samplers.  Child classes should override the sample method.
+    """
+
+    def __init__(self, percent=100.0):
+        """
+        :param percent: the percent of calls to run the trial for
+        :type percent: float
+        """
+        self.percent = percent
+
+    def sample(self, context):
+        """
+        Should the trial be run?
+
+        :param context: the merged context of the perform call
+        :type context: dict
+        :return: asserted to run the trial
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def observe(self, observation):
+        """
+        Called with the observation of every experiment before it is reported so child classes can adjust to
+        the outcomes.
+
+        :param observation: the outcome of an experiment
+        :type observation: Observation
+        """
+        pass
+
+
+class RateSampler(Sampler):
+    """
+    Randomly samples the given percent of calls.
+    """
+
+    def sample(self, context):
+        if self.percent >= 100:
+            return True
+        return thread_random().random() * 100.0 < self.percent
+
+
+class HashSampler(Sampler):
+    """
+    Deterministically samples the given percent of the values of one of the context's keys, so a given user
+    (for example) is either always or never sampled.  Calls whose context does not have the key are sampled
+    randomly at the same rate.
+
+    The salt changes which values are picked, so different experiments can sample different users.
+    """
+
+    def __init__(self, percent=100.0, key=None, salt=''):
+        """
+        :param percent: the percent of the key's values to run the trial for
+        :type percent: float
+        :param key: the name of the perform kwarg to hash
+        :type key: str
+        :param salt: mixed into the hash
+        :type salt: str
+        """
+        super(HashSampler, self).__init__(percent)
+        self.key = key
+        self.salt = salt
+        self.threshold = int(min(max(percent, 0.0), 100.0) / 100.0 * 2 ** 64)
+
+    def sample(self, context):
+        if self.percent >= 100:
+            return True
+        value = context.get(self.key)
+        if value is None:
+            return thread_random().random() * 100.0 < self.percent
+        digest = hashlib.blake2b((self.salt + str(value)).encode('utf-8'), digest_size=8).digest()
+        return struct.unpack('<Q', digest)[0] < self.threshold
+
+
+class AdaptiveSampler(RateSampler):
+    """
+    Randomly samples like RateSampler but lowers the percent while the trial is slow or failing and raises it
+    again while the trial is healthy.
+
+    After every window trials that ran, the share of them that failed (contrite, error, timeout, killed or
+    crashed status) and their mean time are checked.  If the failure rate is over max_failure_rate or the
+    mean time is over max_trial_time seconds, percent is multiplied by backoff but kept at or above
+    min_percent.  Otherwise percent is multiplied by recovery but kept at or below max_percent.
+
+    Usage::
+
+        Scientist.sampler = AdaptiveSampler(10, max_failure_rate=0.05, max_trial_time=0.25)
+
+    """
+    failed_statuses = ('contrite', 'error', 'timeout', 'killed', 'crashed')
+    # statuses where the trial did not run
+    skipped_statuses = ('init', 'disabled', 'dropped', 'open')
+
+    def __init__(self, percent=100.0, min_percent=0.01, max_percent=None, max_failure_rate=0.1, max_trial_time=None,
+                 window=100, backoff=0.5, recovery=1.25):
+        """
+        :param percent: the initial percent of calls to run the trial for
+        :type percent: float
+        :param min_percent: the lowest the percent may be backed off to
+        :type min_percent: float
+        :param max_percent: the highest the percent may recover to, defaults to the initial percent
+        :type max_percent: float
+        :param max_failure_rate: the highest healthy share of failed trials, 0 to 1
+        :type max_failure_rate: float
+        :param max_trial_time: the highest healthy mean trial time in seconds, None to ignore trial times
+        :type max_trial_time: float
+        :param window: the number of trials between adjustments
+        :type window: int
+        :param backoff: multiplies the percent when unhealthy
+        :type backoff: float
+        :param recovery: multiplies the percent when healthy
+        :type recovery: float
+        """
+        super(AdaptiveSampler, self).__init__(percent)
+        self.min_percent = min_percent
+        self.max_percent = percent if max_percent is None else max_percent
+        self.max_failure_rate = max_failure_rate
+        self.max_trial_time = max_trial_time
+        self.window = window
+        self.backoff = backoff
+        self.recovery = recovery
+        self.__lock = threading.Lock()
+        self.__reset()
+
+    def observe(self, observation):
+        if observation.status in self.skipped_statuses:
+            return
+        failed = observation.status in self.failed_statuses or observation.trial_exception is not None
+        with self.__lock:
+            self.__observed += 1
+            self.__failures += failed
+            if observation.trial_elapsed_ns is not None:
+                self.__timed += 1
+                self.__trial_ns += observation.trial_elapsed_ns
+            if self.__observed >= self.window:
+                self.__adjust()
+
+    def __adjust(self):
+        unhealthy = self.__failures > self.max_failure_rate * self.__observed
+        if self.max_trial_time is not None and self.__timed:
+            unhealthy = unhealthy or self.__trial_ns / self.__timed / 1e9 > self.max_trial_time
+        if unhealthy:
+            self.percent = max(self.percent * self.backoff, self.min_percent)
+        else:
+            self.percent = min(self.percent * self.recovery, self.max_percent)
+        self.__reset()
+
+    def __reset(self):
+        self.__observed = 0
+        self.__failures = 0
+        self.__timed = 0
+        self.__trial_ns = 0
@@ -0,0 +1,159 @@
+# coding=utf-8
+
+"""
+Constant memory statistics used by the reports.
+"""
+from math import ceil, sqrt
+
+__docformat__ = 'restructuredtext en'
+__all__ = ('RunningStats', 'LogHistogram', 'ratio_interval')
+
+
+class RunningStats(object):
+    """
+    Running count, mean and variance using Welford's online algorithm.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        """
+        Add a sample.
+
+        :param value: the sample
+        :type value: float
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """
+        Combine the samples of another RunningStats into this one (Chan et al's parallel algorithm).
+
+        :param other: the statistics to add
+        :type other: RunningStats
+        """
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def variance(self):
+        """
+        :return: the sample variance, 0 for fewer than two samples
+        :rtype: float
+        """
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std_dev(self):
+        """
+        :return: the sample standard deviation
+        :rtype: float
+        """
+        return sqrt(self.variance)
+
+
+class LogHistogram(object):
+    """
+    Log-linear bucketed histogram of non-negative integers in the style of HdrHistogram.
+
+    Values are bucketed by their power of two, then by their top significant_bits bits, so a value is never
+    more than 2 ** -significant_bits (under 1% for the default 7 bits) away from it's bucket.  The number of
+    buckets is bounded by the bit length of the largest value times 2 ** significant_bits no matter how many
+    values are added, and histograms with the same significant_bits can be merged by adding bucket counts.
+    """
+
+    def __init__(self, significant_bits=7):
+        self.significant_bits = significant_bits
+        self.counts = {}
+        self.count = 0
+        self.maximum = 0
+
+    def add(self, value):
+        """
+        Add a value.
+
+        :param value: the value, for example an elapsed time in nanoseconds
+        :type value: int
+        """
+        value = max(int(value), 0)
+        shift = max(value.bit_length() - self.significant_bits, 0)
+        index = (shift << self.significant_bits) | (value >> shift)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        if value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other):
+        """
+        Add the counts of another histogram to this one.
+
+        :param other: a histogram with the same significant_bits
+        :type other: LogHistogram
+        """
+        if other.significant_bits != self.significant_bits:
+            raise ValueError("Can not merge histograms with different significant bits")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.maximum = max(self.maximum, other.maximum)
+
+    def percentile(self, percent):
+        """
+        :param percent: the percentile wanted, 0 to 100
+        :type percent: float
+        :return: the value at the given percentile or None if the histogram is empty
+        :rtype: int
+        """
+        if not self.count:
+            return None
+        rank = max(int(ceil(percent / 100.0 * self.count)), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= self.count:
+                # the top bucket holds the maximum which is known exactly
+                return self.maximum
+            if seen >= rank:
+                return self.__bucket_value(index)
+        return self.maximum
+
+    def __bucket_value(self, index):
+        # the middle of the bucket
+        shift = index >> self.significant_bits
+        mantissa = index & ((1 << self.significant_bits) - 1)
+        return (mantissa << shift) + ((1 << shift) - 1) // 2
+
+
+def ratio_interval(numerator, denominator, z=1.96):
+    """
+    Estimate the ratio of the means of two samples with a confidence interval using the delta method.
+
+    :param numerator: the statistics for the numerator sample
+    :type numerator: RunningStats
+    :param denominator: the statistics for the denominator sample
+    :type denominator: RunningStats
+    :param z: the standard normal quantile for the confidence level, 1.96 for 95%
+    :type z: float
+    :return: (ratio, low, high) or None if either sample has fewer than two values or a zero mean
+    :rtype: tuple
+    """
+    if numerator.count < 2 or denominator.count < 2 or not numerator.mean or not denominator.mean:
+        return None
+    ratio = numerator.mean / denominator.mean
+    relative_variance = (numerator.variance / (numerator.count * numerator.mean ** 2) +
+                         denominator.variance / (denominator.count * denominator.mean ** 2))
+    half_width = z * abs(ratio) * sqrt(relative_variance)
+    return ratio, ratio - half_width, ratio + half_width
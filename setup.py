@@ -9,8 +9,8 @@ import sys
 # Old style (not recommended) check to prevent setup.py from being used on old pythons.
 # Current recommended practice is to include supported pythons in the
 # classifiers kwarg even though there is no automated enforcement.
-if sys.version_info < (2, 6):
-    print('Scientist requires python 26 or newer')
+if sys.version_info < (3, 7):
+    print('Scientist requires python 3.7 or newer')
     exit(-1)
 
 #: str: Regular expression for parsing __version__ line in the packages __init__.py file.
@@ -135,15 +135,21 @@ default_kwargs = {
         'Natural Language :: English',
         'Operating System :: OS Independent',
         # 'Operating System :: POSIX :: Linux',
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'Topic :: Software Development',
     ],
+    # 3.8 or newer is needed to send process trials' kwargs through shared memory (see process_runner)
+    'python_requires': '>=3.7',
     'install_requires': required_imports,
     'entry_points': {
-        'console_scripts': ['scientist = scientist.scientist_main:main']
+        'console_scripts': ['scientist = scientist.scientist_main:main',
+                            'scientist-bench = scientist.bench:main']
     }
 }
 
@@ -5,13 +5,41 @@ Using 2 different algorithms for calculating fibonacci sequence (from
 http://stackoverflow.com/questions/494594/how-to-write-the-fibonacci-sequence-in-python)
 as control and trial experiment.
 """
+import array
+import asyncio
+import enum
+import gc
+import json
+import multiprocessing
+import os
+import statistics
 import sys
+import threading
+import time
+import tracemalloc
+import weakref
+
+import pytest
 
 import scientist
-from scientist.experiment import Experiment
+from scientist.async_experiment import AsyncScientist
+from scientist import bench
+from scientist.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from scientist.comparators import NanEqualComparator, ToleranceComparator
+from scientist.diff import diff
+from scientist.executor import TrialExecutor
+from scientist.fingerprint import fingerprint
+from scientist.experiment import EXHAUSTED, Experiment, Runner
 from scientist.in_memory_report import InMemoryReport
+from scientist.mmap_report import MmapReport, collect, collected_summary, pack, unpack
+from scientist.observation import Observation
+from scientist.process_runner import ProcessPool, ProcessRunner
+from scientist.recorder import Recorder, log_paths, read_log, replay
+from scientist.publisher import CallbackSink, FileSink, Publisher
+from scientist.sampler import AdaptiveSampler, HashSampler, RateSampler
+from scientist.stats import LogHistogram, RunningStats
 from scientist import Scientist
-from math import sqrt
+from math import ceil, sqrt
 
 __docformat__ = 'restructuredtext en'
 
@@ -283,3 +311,1236 @@ def test_before_run():
     assert report.statuses['match']
 
 
+def test_background_trial():
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    release = threading.Event()
+
+    def original(**kwargs):
+        return list(SubFib(**kwargs))
+
+    def trial(**kwargs):
+        # hold the only worker thread so the queue fills up
+        release.wait(10)
+        return list(NewSubFib(**kwargs))
+
+    executor = TrialExecutor(workers=1, max_queue=2)
+    for index in range(0, 2000, 100):
+        with Scientist(name, executor_=executor) as experiment:
+            experiment.control.function = original
+            experiment.trial.function = trial
+            result = experiment.perform(startNumber=index, endNumber=3000 + index)
+            # the control result is returned while the trial is still waiting to run
+            assert result
+    release.set()
+    executor.join()
+    executor.shutdown()
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    print(str(report))
+    assert report.control_count == 20
+    assert report.contrary_results == 0
+    assert executor.dropped > 0
+    assert report.statuses['dropped'] == executor.dropped
+    assert report.statuses['match'] == executor.submitted
+
+
+def test_concurrent_trial():
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    def original(**kwargs):
+        time.sleep(0.05)
+        return list(SubFib(**kwargs))
+
+    def trial(**kwargs):
+        time.sleep(0.05)
+        return list(NewSubFib(**kwargs))
+
+    start = time.time()
+    for index in range(0, 500, 100):
+        with Scientist(name) as experiment:
+            experiment.control.function = original
+            experiment.trial.function = trial
+            experiment.concurrent = True
+            result = experiment.perform(startNumber=index, endNumber=3000 + index)
+            assert result
+    # run back to back these would take at least 0.5 seconds
+    assert time.time() - start < 0.45
+
+    # the peak memory of functions running at the same time can not be told apart
+    with Scientist(name) as experiment:
+        experiment.control.function = original
+        experiment.trial.function = trial
+        experiment.trial.trace_allocations = True
+        experiment.concurrent = True
+        with pytest.raises(ValueError):
+            experiment.perform(startNumber=0, endNumber=100)
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    print(str(report))
+    assert report.enabled_count == 5
+    assert report.contrary_results == 0
+    assert report.statuses['match'] == 5
+
+
+def test_trial_timeout():
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    def original(**kwargs):
+        return list(SubFib(**kwargs))
+
+    def trial(**kwargs):
+        time.sleep(0.2)
+        return list(NewSubFib(**kwargs))
+
+    start = time.time()
+    for index in range(0, 500, 100):
+        with Scientist(name) as experiment:
+            experiment.control.function = original
+            experiment.trial.function = trial
+            experiment.concurrent = True
+            experiment.trial_timeout = 0.01
+            result = experiment.perform(startNumber=index, endNumber=3000 + index)
+            assert result
+    assert time.time() - start < 0.5
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    print(str(report))
+    assert report.enabled_count == 5
+    assert report.statuses['timeout'] == 5
+
+
+def test_async_experiment():
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    async def original(**kwargs):
+        await asyncio.sleep(0.01)
+        return list(SubFib(**kwargs))
+
+    async def trial(**kwargs):
+        await asyncio.sleep(0.01)
+        return list(NewSubFib(**kwargs))
+
+    async def slow_trial(**kwargs):
+        await asyncio.sleep(10)
+        return list(NewSubFib(**kwargs))
+
+    async def run():
+        for index in range(0, 1000, 100):
+            async with AsyncScientist(name) as experiment:
+                experiment.control.function = original
+                experiment.trial.function = trial if index < 500 else slow_trial
+                experiment.trial_timeout = 0.1
+                result = await experiment.perform_async(startNumber=index, endNumber=3000 + index)
+                assert result
+
+    start = time.time()
+    asyncio.run(run())
+    # the slow trials were cancelled instead of being waited on
+    assert time.time() - start < 2
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    print(str(report))
+    assert report.enabled_count == 10
+    assert report.contrary_results == 0
+    assert report.statuses['match'] == 5
+    assert report.statuses['timeout'] == 5
+
+    # plain functions run on executor threads, so they overlap instead of blocking the loop in turn
+    def blocking_original(**kwargs):
+        time.sleep(0.05)
+        return list(SubFib(**kwargs))
+
+    def blocking_trial(**kwargs):
+        time.sleep(0.05)
+        return list(NewSubFib(**kwargs))
+
+    async def run_blocking():
+        for index in range(0, 500, 100):
+            async with AsyncScientist(name + '_blocking') as experiment:
+                experiment.control.function = blocking_original
+                experiment.trial.function = blocking_trial
+                assert await experiment.perform_async(startNumber=index, endNumber=3000 + index)
+
+    start = time.time()
+    asyncio.run(run_blocking())
+    # run back to back these would take at least 0.5 seconds
+    assert time.time() - start < 0.45
+    report = Scientist.report.get(name + '_blocking')
+    report.summarize()
+    assert report.statuses == {'match': 5}
+
+
+def test_running_stats():
+    samples = [f(n) / 7.0 for n in range(30)]
+    stats = RunningStats()
+    for sample in samples:
+        stats.add(sample)
+    assert stats.count == len(samples)
+    assert abs(stats.mean - statistics.mean(samples)) < 1e-6 * abs(statistics.mean(samples))
+    assert abs(stats.variance - statistics.variance(samples)) < 1e-6 * statistics.variance(samples)
+
+
+def test_log_histogram():
+    values = [f(n) for n in range(2, 40)] * 3
+    histogram = LogHistogram()
+    other = LogHistogram()
+    for index, value in enumerate(values):
+        (histogram if index % 2 else other).add(value)
+    histogram.merge(other)
+    assert histogram.count == len(values)
+    assert histogram.maximum == max(values)
+    ordered = sorted(values)
+    for percent in (50, 90, 99, 99.9):
+        exact = ordered[max(int(ceil(percent / 100.0 * len(values))), 1) - 1]
+        assert abs(histogram.percentile(percent) - exact) <= exact / 2 ** histogram.significant_bits
+    assert histogram.percentile(100) == max(values)
+    # the number of buckets does not grow with the number of values
+    for value in values * 100:
+        histogram.add(value)
+    assert len(histogram.counts) <= len(set(values))
+
+
+def test_bounded_contrary_experiments():
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    def original(**kwargs):
+        return list(SubFib(**kwargs))
+
+    def trial(**kwargs):
+        # always drops the first value
+        return list(NewSubFib(**kwargs))[1:]
+
+    for index in range(0, 5000, 100):
+        with Scientist(name) as experiment:
+            experiment.control.function = original
+            experiment.trial.function = trial
+            experiment.perform(startNumber=index, endNumber=3000 + index)
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    print(str(report))
+    assert report.control_count == 50
+    assert report.contrary_results == 50
+    assert len(report.contrary_experiments) == InMemoryReport.max_contrary_experiments
+    assert report.statuses['contrite'] == 50
+
+
+def test_clean_does_not_call_again():
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    calls = {'control': 0, 'trial': 0, 'clean': 0}
+
+    def original(**kwargs):
+        calls['control'] += 1
+        return SubFib(**kwargs)
+
+    def trial(**kwargs):
+        calls['trial'] += 1
+        return NewSubFib(**kwargs)
+
+    def first4(value_list):
+        calls['clean'] += 1
+        return value_list[0:4]
+
+    for index in range(0, 2000, 100):
+        with Scientist(name) as experiment:
+            experiment.control.function = original
+            experiment.trial.function = trial
+            # the generators can only be consumed once, a second call would have compared fresh generators
+            experiment.comparator = lambda a, b: list(a) == list(b)
+            experiment.clean = first4
+            experiment.perform(startNumber=index, endNumber=3000 + index)
+            assert calls['clean'] == 0
+
+    assert calls['control'] == 20
+    assert calls['trial'] == 20
+
+    with Scientist(name) as experiment:
+        experiment.control.function = lambda **kwargs: list(SubFib(**kwargs))
+        experiment.trial.function = lambda **kwargs: list(NewSubFib(**kwargs))
+        experiment.clean = first4
+        experiment.perform(startNumber=0, endNumber=100)
+        assert experiment.control.cleaned_value == [0, 1, 1, 2]
+        assert experiment.control.cleaned_value == [0, 1, 1, 2]
+        assert calls['clean'] == 1
+
+        # performing the experiment again cleans the new value
+        experiment.perform(startNumber=100, endNumber=1000)
+        assert experiment.control.cleaned_value == [144, 233, 377, 610]
+        assert calls['clean'] == 2
+
+
+def test_runner_timing():
+    runner = Runner()
+    runner.trace_allocations = True
+    runner.function = lambda **kwargs: [list(range(1000)) for _ in range(10)]
+    runner.execute(clean=None)
+    assert runner.elapsed_ns > 0
+    assert runner.cpu_ns >= 0
+    assert runner.peak_memory > 10000
+    assert runner.elapsed == runner.elapsed_ns / 1e9
+    # the runner leaves tracemalloc running, so don't slow down the rest of the tests
+    tracemalloc.stop()
+
+
+def test_speedup():
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    def original(**kwargs):
+        time.sleep(0.004)
+        return list(SubFib(**kwargs))
+
+    def trial(**kwargs):
+        time.sleep(0.001)
+        return list(NewSubFib(**kwargs))
+
+    for index in range(0, 2000, 100):
+        with Scientist(name) as experiment:
+            experiment.control.function = original
+            experiment.trial.function = trial
+            experiment.perform(startNumber=index, endNumber=3000 + index)
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    print(str(report))
+    assert report.speedup > 1
+    assert report.speedup_low <= report.speedup <= report.speedup_high
+    assert 'Trial speedup' in str(report)
+    assert report.control_histogram.count == 20
+    assert report.control_histogram.percentile(50) > report.trial_histogram.percentile(50)
+    assert 'Trial time percentiles: p50=' in str(report)
+
+
+def test_compare_generators_lazily():
+    experiment = Experiment('test_compare_generators_lazily')
+
+    # infinite generators can be compared once capped
+    experiment.compare_max_elements = 1000
+    assert experiment.compare_generators(F(), F())
+    assert experiment.divergence is None
+
+    # the first difference ends the comparison
+    assert not experiment.compare_generators(F(), F_buggy())
+    assert experiment.divergence == (0, 0, 1)
+
+    experiment.compare_max_elements = None
+    assert not experiment.compare_generators(SubFib(0, 100), NewSubFib(0, 200))
+    assert experiment.divergence == (12, EXHAUSTED, 144)
+
+    assert not experiment.compare_generators(SubFib(0, 100), KaboomSubFib(0, 100))
+    assert experiment.divergence == (5, 5, EXHAUSTED)
+    assert isinstance(experiment.trial.exception, ValueError)
+
+
+def test_rate_sampler():
+    sampler = RateSampler(12.5)
+    hits = sum(1 for _ in range(100000) if sampler.sample({}))
+    assert 11500 < hits < 13500
+
+    sampler = RateSampler(0.001)
+    assert sum(1 for _ in range(100000) if sampler.sample({})) < 10
+    assert all(RateSampler(100).sample({}) for _ in range(1000))
+    assert not any(RateSampler(0).sample({}) for _ in range(1000))
+
+
+def test_hash_sampler():
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    sampler = HashSampler(10, key='user')
+    picked = [user for user in range(100000) if sampler.sample({'user': user})]
+    assert 9000 < len(picked) < 11000
+    # the same users are always picked
+    assert picked == [user for user in range(100000) if sampler.sample({'user': user})]
+    # a different salt picks different users
+    assert picked != [user for user in range(100000) if HashSampler(10, key='user', salt='x').sample({'user': user})]
+
+    for repeat_ in range(3):
+        for index in range(0, 20000, 100):
+            with Scientist(name, sampler_=HashSampler(25, key='startNumber')) as experiment:
+                experiment.control.function = lambda **kwargs: list(SubFib(**kwargs))
+                experiment.trial.function = lambda **kwargs: list(NewSubFib(**kwargs))
+                experiment.perform(startNumber=index, endNumber=30000 + index)
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    print(str(report))
+    # each startNumber was either always or never sampled
+    assert report.enabled_count % 3 == 0
+    assert report.statuses['disabled'] % 3 == 0
+    assert report.enabled_count and report.statuses['disabled']
+
+
+def test_adaptive_sampler():
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    sampler = AdaptiveSampler(100, min_percent=1, window=10)
+
+    def run(trial, calls):
+        for index in range(0, calls * 100, 100):
+            with Scientist(name, sampler_=sampler) as experiment:
+                experiment.control.function = lambda **kwargs: list(SubFib(**kwargs))
+                experiment.trial.function = trial
+                experiment.perform(startNumber=index, endNumber=30000 + index)
+
+    # a failing trial backs off to the minimum
+    run(lambda **kwargs: list(KaboomSubFib(**kwargs)), 5000)
+    assert sampler.percent == 1
+
+    # a healthy trial recovers to the maximum
+    sampler.percent = 50
+    run(lambda **kwargs: list(NewSubFib(**kwargs)), 500)
+    assert sampler.percent == 100
+
+    # a slow trial backs off when a time limit is set
+    sampler.max_trial_time = 0.0001
+
+    def slow_trial(**kwargs):
+        time.sleep(0.0005)
+        return list(NewSubFib(**kwargs))
+
+    run(slow_trial, 50)
+    assert sampler.percent < 100
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    print(str(report))
+    assert report.statuses['disabled']
+
+
+def test_threaded_reports():
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    reports = []
+    start = threading.Event()
+
+    def work(thread_index):
+        start.wait(10)
+        reports.append(Scientist.report.get(name))
+        for index in range(0, 50000, 100):
+            with Scientist(name) as experiment:
+                experiment.control.function = lambda **kwargs: list(SubFib(**kwargs))
+                # every other thread runs a trial that always disagrees
+                experiment.trial.function = lambda **kwargs: list(NewSubFib(**kwargs)) + [0] * (thread_index % 2)
+                experiment.perform(startNumber=index, endNumber=3000 + index)
+
+    threads = [threading.Thread(target=work, args=(thread_index,)) for thread_index in range(8)]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+
+    # every thread got the same report
+    assert len(set(id(report) for report in reports)) == 1
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    print(str(report))
+    assert report.control_count == 8 * 500
+    assert report.enabled_count == 8 * 500
+    assert report.contrary_results == 4 * 500
+    assert report.statuses == {'match': 4 * 500, 'contrite': 4 * 500}
+    assert report.control_histogram.count == 8 * 500
+    assert len(report.contrary_experiments) == InMemoryReport.max_contrary_experiments
+    # summarizing again after the threads exited gives the same totals
+    report.summarize()
+    assert report.control_count == 8 * 500
+    assert report.contrary_results == 4 * 500
+
+
+
+def test_short_lived_threads():
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    def work():
+        with Scientist(name) as experiment:
+            experiment.control.function = lambda **kwargs: 1
+            experiment.trial.function = lambda **kwargs: 1
+            experiment.perform()
+
+    for index in range(50):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+    report = Scientist.report.get(name)
+    # the shards of the exited threads were retired as new threads registered theirs
+    # noinspection PyProtectedMember,PyUnresolvedReferences
+    assert len(report._InMemoryReport__shards) <= 2
+    report.summarize()
+    assert report.control_count == 50
+    assert report.statuses == {'match': 50}
+
+
+def _mmap_worker(name, worker):
+    for index in range(0, 25000, 100):
+        with Scientist(name, report_=MmapReport) as experiment:
+            experiment.control.function = lambda **kwargs: list(SubFib(**kwargs))
+            experiment.trial.function = lambda **kwargs: list(NewSubFib(**kwargs)) + [0] * (worker % 2)
+            experiment.perform(startNumber=index, endNumber=3000 + index)
+    MmapReport.flush()
+
+
+def test_mmap_report(tmp_path):
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    MmapReport.directory = str(tmp_path)
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_mmap_worker, args=(name, worker)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    aggregate = collect(str(tmp_path))[name]
+    assert aggregate.control_count == 4 * 250
+    assert aggregate.contrary_results == 2 * 250
+    assert aggregate.statuses == {'match': 2 * 250, 'contrite': 2 * 250}
+    assert aggregate.control_times.count == 4 * 250
+    assert aggregate.trial_histogram.count == 4 * 250
+
+    summary = collected_summary(str(tmp_path))
+    print(summary)
+    assert 'Total experiments: 1000' in summary
+    assert 'Trial time percentiles' in summary
+
+    # a forked child does not publish the totals it inherited from it's parent again
+    name += '_fork'
+    MmapReport.directory = str(tmp_path / 'fork')
+    for index in range(10):
+        with Scientist(name, report_=MmapReport) as experiment:
+            experiment.control.function = lambda **kwargs: list(SubFib(**kwargs))
+            experiment.trial.function = lambda **kwargs: list(SubFib(**kwargs))
+            experiment.perform(startNumber=index, endNumber=100 + index)
+    MmapReport.flush()
+
+    child = multiprocessing.get_context('fork').Process(target=_mmap_child, args=(name,))
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+    assert collect(str(tmp_path / 'fork'))[name].control_count == 15
+
+    # publishing errors on the experiment's thread are counted
+    MmapReport.directory = None
+    with pytest.warns(RuntimeWarning):
+        MmapReport.get(name + '_unset')
+    failed_flushes = MmapReport.failed_flushes
+    for index in range(MmapReport.publish_every):
+        with Scientist(name + '_unset', report_=MmapReport) as experiment:
+            experiment.control.function = sub_fib_list
+            experiment.trial.function = sub_fib_list
+            experiment.perform(startNumber=index, endNumber=100 + index)
+    assert MmapReport.failed_flushes == failed_flushes + 1
+
+    MmapReport.configure(str(tmp_path / 'configured'))
+    assert MmapReport.directory == str(tmp_path / 'configured')
+
+
+def _mmap_child(name):
+    for index in range(5):
+        with Scientist(name, report_=MmapReport) as experiment:
+            experiment.control.function = lambda **kwargs: list(SubFib(**kwargs))
+            experiment.trial.function = lambda **kwargs: list(SubFib(**kwargs))
+            experiment.perform(startNumber=index, endNumber=100 + index)
+    MmapReport.flush()
+
+
+def test_publisher(tmp_path):
+    # noinspection PyProtectedMember
+    name = sys._getframe().f_code.co_name
+
+    batches = []
+    path = str(tmp_path / 'records.jsonl')
+    publisher = Publisher([CallbackSink(batches.append), FileSink(path)], batch_size=10, flush_interval=0.05)
+
+    for index in range(0, 9500, 100):
+        with Scientist(name, report_=publisher) as experiment:
+            experiment.control.function = lambda **kwargs: list(SubFib(**kwargs))
+            experiment.trial.function = lambda **kwargs: list(KaboomSubFib(**kwargs))
+            experiment.perform(startNumber=index, endNumber=3000 + index)
+    assert publisher.flush(10)
+
+    records = [record for batch in batches for record in batch]
+    assert len(records) == 95
+    assert max(len(batch) for batch in batches) <= 10
+    assert set(record.status for record in records) == {'contrite'}
+    assert records[0].trial_exception == 'ValueError'
+
+    # disabled calls are only counted and published as one observation per description
+    del batches[:]
+
+    def disabled(count):
+        for _ in range(count):
+            with Scientist(name, report_=publisher) as experiment:
+                experiment.control.function = lambda **kwargs: 1
+                experiment.duty_cycle = 0
+                experiment.perform()
+
+    threads = [threading.Thread(target=disabled, args=(100,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    disabled(50)
+    for thread in threads:
+        thread.join()
+    assert publisher.flush(10)
+    records = [record for batch in batches for record in batch]
+    assert set(record.status for record in records) == {'disabled'}
+    assert sum(record.count for record in records) == 350
+    assert len(records) <= 10
+
+    report = InMemoryReport('publisher counts')
+    for record in records:
+        report.append(record)
+    report.summarize()
+    assert report.control_count == 350
+    assert report.statuses == {'disabled': 350}
+
+    publisher.close()
+    with open(path) as in_file:
+        lines = [json.loads(line) for line in in_file]
+    assert len(lines) == 95 + len(records)
+    assert lines[0]['description'] == name
+    assert sum(line['count'] for line in lines) == 95 + 350
+
+
+def test_observation():
+    """
+    Reports keep compact observations rather than the experiments.
+    """
+    name = 'test_observation'
+
+    with Scientist(name) as experiment:
+        experiment.control.function = lambda **kwargs: list(SubFib(**kwargs))
+        experiment.trial.function = lambda **kwargs: list(SubFib(**kwargs)) + [0]
+        experiment.digest = len
+        experiment.perform(startNumber=0, endNumber=100)
+    observation = experiment.observation
+    assert isinstance(observation, Observation)
+    assert observation.status == 'contrite'
+    assert observation.trial_digest == observation.control_digest + 1
+    assert observation.mismatch.trial.value[-1] == 0
+    assert observation.as_dict()['description'] == name
+    assert 'mismatch' not in observation.as_dict()
+
+    experiment_ref = weakref.ref(experiment)
+    del experiment
+    gc.collect()
+    assert experiment_ref() is None
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    assert report.contrary_experiments == [observation]
+    assert 'trial value: ' in str(report)
+
+
+class Status(enum.Enum):
+    OK = 1
+    FAILED = 2
+
+
+def test_fingerprint():
+    """
+    Fingerprints are order aware for sequences, order independent for dicts and sets, and type aware.
+    """
+    value = {'a': [1, 2.5, 'x'], 'b': {3, 4}, 'c': (None, True, b'z')}
+    assert fingerprint(value) == fingerprint({'c': (None, True, b'z'), 'b': {4, 3}, 'a': [1, 2.5, 'x']})
+    assert fingerprint([1, 2]) != fingerprint([2, 1])
+    assert fingerprint([1, 2]) != fingerprint((1, 2))
+    assert fingerprint(1) != fingerprint('1')
+    assert fingerprint(['ab']) != fingerprint(['a', 'b'])
+    assert len(fingerprint(value, digest_size=8)) == 16
+    assert fingerprint(0.0) == fingerprint(-0.0)
+    assert fingerprint(array.array('d', [1.0, 2.0])) != fingerprint(array.array('f', [1.0, 2.0]))
+    with pytest.raises(TypeError):
+        fingerprint(threading.Lock())
+    assert fingerprint(Observation) == fingerprint(Observation)
+    assert fingerprint(fingerprint) != fingerprint(diff)
+    assert fingerprint(multiprocessing.get_start_method) == fingerprint(multiprocessing.get_start_method)
+
+    class Slotted(object):
+        __slots__ = ('a',)
+
+        def __init__(self, a):
+            self.a = a
+
+    assert fingerprint(Slotted(1)) == fingerprint(Slotted(1))
+    assert fingerprint(Slotted(1)) != fingerprint(Slotted(2))
+
+    name = 'test_fingerprint'
+    for offset in (0, 1):
+        with Scientist(name) as experiment:
+            experiment.comparator = experiment.compare_fingerprints
+            experiment.control.function = lambda **kwargs: list(SubFib(**kwargs))
+            experiment.trial.function = lambda **kwargs: [item + offset for item in SubFib(**kwargs)]
+            experiment.perform(startNumber=0, endNumber=1000)
+        assert experiment.observation.control_digest == fingerprint(experiment.control.value)
+        assert experiment.observation.status == ('match', 'contrite')[offset]
+
+    # values that can not be fingerprinted are compared with ==
+    lock = threading.Lock()
+    with Scientist(name) as experiment:
+        experiment.comparator = experiment.compare_fingerprints
+        experiment.control.function = lambda **kwargs: {'lock': lock, 'status': Status.OK}
+        experiment.trial.function = lambda **kwargs: {'lock': lock, 'status': Status.OK}
+        experiment.perform()
+    assert experiment.status == 'match'
+    assert experiment.observation.control_digest is None
+    assert fingerprint(Status.OK) != fingerprint(Status.FAILED)
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    assert report.statuses == {'match': 2, 'contrite': 1}
+    assert 'digests: control ' in str(report)
+
+
+def test_array_fingerprint():
+    """
+    Arrays are fingerprinted by their element type, shape and every element.
+    """
+    numpy = pytest.importorskip('numpy')
+    control = numpy.zeros(10000)
+    trial = control.copy()
+    trial[5000] = 1
+    assert fingerprint(control) != fingerprint(trial)
+    assert fingerprint(control) == fingerprint(numpy.zeros(10000))
+    assert fingerprint(control) != fingerprint(control.reshape(100, 100))
+    assert fingerprint(control) != fingerprint(control.astype(numpy.float32))
+    assert fingerprint(trial[::2]) == fingerprint(trial[::2].copy())
+
+
+def test_diff():
+    """
+    Structural diffs align sequences, compare numbers with a tolerance and are bounded.
+    """
+    differences = diff({'a': [1, 2, 3], 'b': {1, 2}, 'c': 1.0}, {'a': [1, 3], 'b': {2, 3}, 'c': 1.0001, 'd': 0},
+                       tolerance=0.001)
+    assert [(difference.path, difference.kind) for difference in differences] == [
+        (('a', 1), 'removed'), (('b',), 'removed'), (('b',), 'added'), (('d',), 'added')]
+    assert str(diff([{'x': 1}], [{'x': 2}])) == "value[0]['x']: control 1, trial 2"
+    assert not diff([1.0, (2, 3)], [1.0, (2, 3)])
+    # locks can not be fingerprinted, so the elements are compared index by index
+    lock = threading.Lock()
+    assert [(difference.path, difference.kind) for difference in diff([lock, 1, 2], [lock, 1, 3])] == [
+        ((2,), 'changed')]
+
+    bounded = diff(list(range(100)), [-1] * 100, max_differences=5)
+    assert len(bounded) == 5 and bounded.truncated
+    assert [difference.path for difference in diff([[[1]]], [[[2]]], max_depth=1)] == [(0,)]
+
+    name = 'test_diff'
+    with Scientist(name) as experiment:
+        experiment.control.function = lambda **kwargs: {'values': list(SubFib(**kwargs))}
+        experiment.trial.function = lambda **kwargs: {'values': list(SubFib(**kwargs))[1:]}
+        experiment.perform(startNumber=0, endNumber=100)
+    report = Scientist.report.get(name)
+    report.summarize()
+    assert "value['values'][0]: only in control 0" in str(report)
+
+
+def test_diff_arrays():
+    """
+    numpy arrays are diffed as a whole so contrary array results don't break the report.
+    """
+    numpy = pytest.importorskip('numpy')
+    assert not diff({'a': numpy.arange(5.0)}, {'a': numpy.arange(5.0)})
+    differences = diff([numpy.arange(5.0)], [numpy.arange(5.0) + 1])
+    assert [difference.kind for difference in differences] == ['changed']
+    assert len(diff(numpy.arange(5.0), [0.0, 1.0, 2.0, 3.0, 4.0])) == 1
+
+    name = 'test_diff_arrays'
+    with Scientist(name) as experiment:
+        experiment.comparator = ToleranceComparator()
+        experiment.control.function = lambda **kwargs: numpy.arange(5.0)
+        experiment.trial.function = lambda **kwargs: numpy.arange(5.0) + 1
+        experiment.perform()
+    assert experiment.status == 'contrite'
+    report = Scientist.report.get(name)
+    report.summarize()
+    assert "differences:\n  value: control array(" in str(report)
+    assert name in Scientist.report.summary()
+
+
+def test_comparators():
+    """
+    Tolerant comparators record the largest deviation between the values.
+    """
+    comparator = ToleranceComparator(rel_tol=1e-6)
+    comparison = comparator([1.0, {'a': 2.0}], [1.0000001, {'a': 2.0}])
+    assert comparison and abs(comparison.deviation - 1e-7) < 1e-12
+    assert not comparator([1.0, 2.0], [1.0, 2.1])
+    assert not comparator([1.0], [1.0, 2.0])
+    assert not comparator(float('nan'), float('nan'))
+    assert NanEqualComparator()([float('nan'), 1.0], [float('nan'), 1.0])
+    assert not NanEqualComparator()(1.0, 1.0000001)
+    assert comparator(array.array('d', [1.0, 2.0]), array.array('d', [1.0, 2.0000000001]))
+    assert comparator('a', 'a') and comparator('a', 'a').deviation is None
+
+    name = 'test_comparators'
+    for offset in (1e-12, 0.5):
+        with Scientist(name) as experiment:
+            experiment.comparator = ToleranceComparator(abs_tol=1e-9)
+            experiment.control.function = lambda **kwargs: [float(item) for item in SubFib(**kwargs)]
+            experiment.trial.function = lambda **kwargs: [item + offset for item in SubFib(**kwargs)]
+            experiment.perform(startNumber=0, endNumber=100)
+        assert experiment.observation.deviation == experiment.deviation
+    report = Scientist.report.get(name)
+    report.summarize()
+    assert report.statuses == {'match': 1, 'contrite': 1}
+    assert report.max_deviation == 0.5
+    assert 'Max deviation: 0.5' in str(report)
+
+
+def test_array_comparators():
+    """
+    numpy arrays are compared in chunks.
+    """
+    numpy = pytest.importorskip('numpy')
+    control = numpy.linspace(0.0, 1.0, 1000)
+    trial = control.copy()
+    trial[500] += 1e-3
+    trial[10] = control[10] = numpy.nan
+    comparator = ToleranceComparator(abs_tol=1e-2, nan_equal=True, chunk_size=64)
+    comparison = comparator(control, trial)
+    assert comparison and abs(comparison.deviation - 1e-3) < 1e-9
+    assert not ToleranceComparator(chunk_size=64)(control, trial)
+    assert not comparator(control, trial[:-1])
+    assert comparator(memoryview(numpy.arange(10.0)), numpy.arange(10.0))
+
+    # arrays nested in containers or compared with other values
+    comparison = comparator({'a': control, 'b': [1.0, control]}, {'a': trial, 'b': [1.0, trial]})
+    assert comparison and abs(comparison.deviation - 1e-3) < 1e-9
+    assert not comparator({'a': control}, {'a': trial + 1.0})
+    assert not comparator(control, list(control))
+    assert not comparator([control], [list(control)])
+    assert not ToleranceComparator()(numpy.arange(3.0), 1.0)
+
+    # non numeric arrays, numpy scalars and ints too large to be floats
+    assert comparator(numpy.array(['a']), numpy.array(['a']))
+    assert not comparator(numpy.array(['a']), numpy.array(['b']))
+    assert comparator(numpy.array([None, 'a'], dtype=object), numpy.array([None, 'a'], dtype=object))
+    assert not comparator(numpy.array(['2020-01-01'], dtype='datetime64[D]'),
+                          numpy.array(['2020-01-02'], dtype='datetime64[D]'))
+    comparison = comparator(numpy.float32(1.0), numpy.float32(1.001))
+    assert comparison and abs(comparison.deviation - 1e-3) < 1e-6
+    assert ToleranceComparator(abs_tol=1)(numpy.int32(2), numpy.int32(3)).deviation == 1.0
+    assert not comparator(10 ** 400, 10 ** 400 + 1)
+    assert comparator(10 ** 400, 10 ** 400)
+
+    with Scientist('test_array_comparators') as experiment:
+        experiment.comparator = comparator
+        experiment.control.function = lambda **kwargs: {'values': numpy.arange(5.0)}
+        experiment.trial.function = lambda **kwargs: {'values': list(numpy.arange(5.0))}
+        experiment.perform()
+    assert experiment.status == 'contrite'
+
+
+def test_bench(tmp_path, capsys):
+    """
+    The benchmark replays a corpus through the control and trial.
+    """
+    corpus = [{'startNumber': index, 'endNumber': 1000 + index} for index in range(0, 500, 100)]
+    benchmark = bench.Benchmark(lambda **kwargs: list(SubFib(**kwargs)),
+                                lambda **kwargs: [item or 1 for item in SubFib(**kwargs)], corpus, warmup=1, repeats=8)
+    report = benchmark.run()
+    assert len(report.observations) == 40
+    assert report.mismatches == 8
+    assert report.control_count == 40 - report.rejected
+    assert report.speedup is not None
+    assert benchmark.description not in Scientist.report.reports
+    assert 'Mismatch rate: 20.000% (8 of 40 calls)' in str(report)
+
+    path = tmp_path / 'corpus.jsonl'
+    path.write_text('{"obj": [1, 2]}\n{"obj": {"a": null}}\n')
+    assert bench.main(['json:dumps', 'json:dumps', str(path), '--repeats', '4', '--warmup', '0']) == 0
+    assert 'Mismatch rate: 0.000% (0 of 8 calls)' in capsys.readouterr().out
+
+
+def sub_fib_list(**kwargs):
+    return list(SubFib(**kwargs))
+
+
+def half_wrong_sub_fib_list(**kwargs):
+    return list(SubFib(**kwargs)) + [0] if kwargs['startNumber'] % 200 else list(SubFib(**kwargs))
+
+
+def test_recorder(tmp_path):
+    """
+    Recorded calls are rotated and replayed through a new trial in worker processes.
+    """
+    name = 'test_recorder'
+    path = str(tmp_path / 'experiment.rec')
+    recorder = Recorder(path, percent=100, max_bytes=4096, backups=100)
+
+    for index in range(0, 10000, 100):
+        with Scientist(name) as experiment:
+            experiment.recorder = recorder
+            experiment.control.function = sub_fib_list
+            experiment.trial.function = sub_fib_list
+            experiment.perform(startNumber=index, endNumber=3000 + index)
+    recorder.close()
+    assert recorder.recorded == 100
+
+    paths = log_paths(path)
+    assert len(paths) > 1 and paths[-1] == path
+    recordings = [recording for log in paths for recording in read_log(log)]
+    assert [recording.context['startNumber'] for recording in recordings] == list(range(0, 10000, 100))
+    assert recordings[0].description == name
+    assert recordings[0].value == sub_fib_list(startNumber=0, endNumber=3000)
+
+    reports = replay(paths, half_wrong_sub_fib_list, processes=2, chunk_size=7)
+    report = reports[name]
+    assert report.control_count == 100
+    assert report.statuses == {'match': 50, 'contrite': 50}
+
+    # a log that can not be written is counted without failing the call
+    recorder = Recorder(str(tmp_path / 'missing' / 'experiment.rec'), percent=100)
+    with Scientist(name) as experiment:
+        experiment.recorder = recorder
+        experiment.control.function = sub_fib_list
+        experiment.trial.function = sub_fib_list
+        assert experiment.perform(startNumber=1, endNumber=100) == sub_fib_list(startNumber=1, endNumber=100)
+    assert (recorder.recorded, recorder.failed) == (0, 1)
+
+
+def test_disabled_fast_path():
+    """
+    A disabled experiment costs about as much as calling the control directly and is only counted, while
+    deciding with a sampler (which needs the context) takes the full path.
+    """
+    name = 'test_disabled_fast_path'
+    calls = 2000
+
+    def control(**kwargs):
+        return sum(range(kwargs['count']))
+
+    def best_time(function, count):
+        # the best of several runs filters out scheduling noise
+        times = []
+        for _ in range(7):
+            start = time.perf_counter()
+            for _ in range(calls):
+                function(count=count)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    with Scientist(name) as experiment:
+        experiment.control.function = control
+        experiment.trial.function = control
+        experiment.duty_cycle = 0
+        with Scientist(name + '_sampled', sampler_=RateSampler(0)) as sampled_experiment:
+            sampled_experiment.control.function = control
+            sampled_experiment.trial.function = control
+            direct_time = best_time(control, 1000)
+            disabled_time = best_time(experiment.perform, 1000)
+            # with a control that does nothing the times are all overhead
+            overhead = best_time(experiment.perform, 0) - best_time(control, 0)
+            full_path_overhead = best_time(sampled_experiment.perform, 0) - best_time(control, 0)
+        assert experiment.perform(count=10) == 45
+        assert experiment.control.value is None
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    assert report.control_count == 14 * calls + 1
+    assert report.statuses == {'disabled': 14 * calls + 1}
+    assert disabled_time < direct_time * 1.5, (disabled_time, direct_time)
+    assert overhead < full_path_overhead / 2, (overhead, full_path_overhead)
+
+
+def test_candidates():
+    """
+    Several candidates are compared with the control in one perform and reported separately.
+    """
+    name = 'test_candidates'
+
+    def slow_sub_fib_list(**kwargs):
+        time.sleep(0.002)
+        return list(SubFib(**kwargs))
+
+    for concurrent_candidates in (False, True):
+        for index in range(0, 1000, 100):
+            with Scientist(name) as experiment:
+                experiment.concurrent_candidates = concurrent_candidates
+                experiment.control.function = lambda **kwargs: list(SubFib(**kwargs))
+                experiment.add_candidate('fast', lambda **kwargs: list(SubFib(**kwargs)))
+                experiment.add_candidate('slow', slow_sub_fib_list)
+                experiment.add_candidate('wrong', lambda **kwargs: list(SubFib(**kwargs)) + [0])
+                experiment.perform(startNumber=index, endNumber=3000 + index)
+            assert experiment.status == 'contrite'
+            assert [candidate.status for candidate in experiment.candidates] == ['match', 'match', 'contrite']
+            assert experiment.observation.mismatch.trial.name == 'wrong'
+            assert experiment.observation.trial_elapsed_ns is None
+
+    with pytest.raises(ValueError):
+        experiment.add_candidate('fast', list)
+
+    # each runner keeps the digest of it's own value
+    with Scientist(name + '_fingerprints') as experiment:
+        experiment.comparator = experiment.compare_fingerprints
+        experiment.control.function = lambda **kwargs: list(SubFib(**kwargs))
+        experiment.trial.function = lambda **kwargs: list(SubFib(**kwargs))
+        experiment.add_candidate('wrong', lambda **kwargs: list(SubFib(**kwargs)) + [0])
+        experiment.perform(startNumber=0, endNumber=100)
+    assert experiment.observation.trial_digest == experiment.observation.control_digest
+    assert experiment.candidates[0].digest == fingerprint(list(SubFib(startNumber=0, endNumber=100)) + [0])
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    assert sorted(report.candidates) == ['fast', 'slow', 'wrong']
+    assert report.candidates['fast'].statuses == {'match': 20}
+    assert report.candidates['wrong'].statuses == {'contrite': 20}
+    assert report.candidates['slow'].times.mean > 0.002
+    assert report.fastest_candidate == 'fast'
+    assert 'Fastest correct candidate: fast' in str(report)
+    assert 'candidate wrong value: ' in str(report)
+
+    unpacked = unpack(pack({name: report.aggregate()}))[name]
+    assert unpacked.candidates['wrong'].statuses == {'contrite': 20}
+    assert unpacked.candidates['slow'].times.count == 20
+
+
+def test_async_candidates():
+    """
+    Async candidates run as their own tasks alongside the trial.
+    """
+    async def candidate(**kwargs):
+        await asyncio.sleep(0.01)
+        return kwargs['value']
+
+    async def run():
+        async with AsyncScientist('test_async_candidates') as experiment:
+            experiment.control.function = lambda **kwargs: kwargs['value']
+            experiment.trial.function = candidate
+            experiment.add_candidate('first', candidate)
+            experiment.add_candidate('second', candidate)
+            start = time.perf_counter()
+            assert await experiment.perform_async(value=1) == 1
+            return experiment, time.perf_counter() - start
+
+    experiment, elapsed = asyncio.run(run())
+    assert experiment.status == 'match'
+    assert [candidate.status for candidate in experiment.candidates] == ['match', 'match']
+    assert elapsed < 0.025
+
+
+def sleepy_sub_fib_list(**kwargs):
+    time.sleep(10)
+    return sub_fib_list(**kwargs)
+
+
+def crashing_sub_fib_list(**kwargs):
+    os._exit(3)
+
+
+def spinning_sub_fib_list(**kwargs):
+    while True:
+        pass
+
+
+def greedy_sub_fib_list(**kwargs):
+    return len(bytearray(2 * 1024 ** 3))
+
+
+def test_process_runner():
+    """
+    Trials run in worker processes, and trials that hang, crash or go over their limits are reported
+    without affecting the control.
+    """
+    name = 'test_process_runner'
+    pool = ProcessPool(workers=2, cpu_seconds=1, memory_bytes=1024 ** 3, timeout=5)
+    try:
+        statuses = []
+        for trial, timeout in ((sub_fib_list, 5), (half_wrong_sub_fib_list, 5), (sleepy_sub_fib_list, 0.5),
+                               (crashing_sub_fib_list, 5), (spinning_sub_fib_list, 5), (greedy_sub_fib_list, 5)):
+            pool.timeout = timeout
+            with Scientist(name) as experiment:
+                experiment.trial = ProcessRunner(pool)
+                experiment.control.function = sub_fib_list
+                experiment.trial.function = trial
+                assert experiment.perform(startNumber=1, endNumber=100) == sub_fib_list(startNumber=1,
+                                                                                        endNumber=100)
+            statuses.append(experiment.status)
+        assert statuses == ['match', 'contrite', 'killed', 'crashed', 'killed', 'contrite']
+        assert experiment.trial.exception.__class__ is MemoryError
+        assert (pool.killed, pool.crashed) == (2, 1)
+
+        # the replaced workers still run trials
+        with Scientist(name) as experiment:
+            experiment.trial = ProcessRunner(pool)
+            experiment.control.function = sub_fib_list
+            experiment.trial.function = sub_fib_list
+            experiment.perform(startNumber=1, endNumber=100)
+        assert experiment.status == 'match'
+        assert experiment.trial.cpu_ns > 0
+    finally:
+        pool.close()
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    assert report.statuses['killed'] == 2
+    assert report.statuses['crashed'] == 1
+
+
+def checksum(data, more=None, **kwargs):
+    return (type(data).__name__, sum(data[::4096]), len(data), None if more is None else float(more.sum()))
+
+
+def test_process_runner_shared_kwargs():
+    """
+    Large kwargs are sent to the workers through shared memory and small ones inline.
+    """
+    numpy = pytest.importorskip('numpy')
+    name = 'test_process_runner_shared_kwargs'
+    pool = ProcessPool(workers=1, shared_bytes=1024)
+    try:
+        for data in (b'\x01' * 100, b'\x02' * 100000, bytearray(b'\x03' * 300000), numpy.arange(50000),
+                     b'\x04' * 200000):
+            with Scientist(name) as experiment:
+                experiment.trial = ProcessRunner(pool)
+                experiment.control.function = checksum
+                experiment.trial.function = checksum
+                experiment.perform(data=data, more=numpy.ones(1000))
+            assert experiment.status == 'match', experiment.trial.exception
+    finally:
+        pool.close()
+
+
+def test_circuit_breaker():
+    """
+    The trial is skipped while it's circuit is open and probed again after the cooldown.
+    """
+    name = 'test_circuit_breaker'
+    now = [0.0]
+    breaker = CircuitBreaker(max_failure_rate=0.5, window=10, min_calls=4, cooldown=30, clock=lambda: now[0])
+
+    def perform(trial):
+        with Scientist(name, breaker_=breaker) as experiment:
+            experiment.control.function = sub_fib_list
+            experiment.trial.function = trial
+            assert experiment.perform(startNumber=1, endNumber=100) == sub_fib_list(startNumber=1, endNumber=100)
+        return experiment.status
+
+    assert [perform(sub_fib_list) for _ in range(4)] == ['match'] * 4
+    assert [perform(half_wrong_sub_fib_list) for _ in range(5)] == ['contrite'] * 5
+    assert breaker.state(name) == OPEN
+    assert perform(sub_fib_list) == 'open'
+
+    # the probe fails so the circuit opens again
+    now[0] = 31
+    assert breaker.state(name) == HALF_OPEN
+    assert perform(half_wrong_sub_fib_list) == 'contrite'
+    assert perform(sub_fib_list) == 'open'
+
+    # the probe succeeds so the circuit closes
+    now[0] = 62
+    assert breaker.allow(name)
+    assert not breaker.allow(name)
+    now[0] = 93
+    assert perform(sub_fib_list) == 'match'
+    assert breaker.state(name) == CLOSED
+    assert perform(sub_fib_list) == 'match'
+
+    slow_breaker = CircuitBreaker(max_trial_time=0.001, window=4, min_calls=2)
+    for _ in range(2):
+        with Scientist(name + '_slow', breaker_=slow_breaker) as experiment:
+            experiment.control.function = sub_fib_list
+            experiment.trial.function = sleepy_fib_list
+            experiment.perform(startNumber=1, endNumber=100)
+    assert slow_breaker.state(name + '_slow') == OPEN
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    assert report.statuses['open'] == 2
+
+
+def sleepy_fib_list(**kwargs):
+    time.sleep(0.002)
+    return sub_fib_list(**kwargs)
+
+
+def test_decorator():
+    """
+    The decorator performs an experiment for each call, passing positional arguments by name.
+    """
+    name = 'test_decorator'
+
+    def trial(start, end=100, **kwargs):
+        return list(SubFib(startNumber=start, endNumber=end)) + ([0] if start == 13 else [])
+
+    @scientist.experiment(name, trial=trial, comparator=lambda a, b: a == b)
+    def control(start, end=100, **kwargs):
+        """the control"""
+        return list(SubFib(startNumber=start, endNumber=end))
+
+    assert control.__doc__ == 'the control'
+    # the decorator does not hide the experiment module
+    import scientist.experiment as experiment_module
+    assert experiment_module.Experiment is Experiment
+    assert control(1) == list(SubFib(startNumber=1, endNumber=100))
+    assert control(1, 200, extra=True) == list(SubFib(startNumber=1, endNumber=200))
+    assert control(end=50, start=13) == list(SubFib(startNumber=13, endNumber=50))
+    with pytest.raises(TypeError):
+        control(1, start=2)
+
+    report = Scientist.report.get(name)
+    report.summarize()
+    assert report.statuses == {'match': 2, 'contrite': 1}
+
+    @scientist.experiment(name + '_sampled', trial=trial, sample=0)
+    def sampled_out(start):
+        return list(SubFib(startNumber=start, endNumber=100))
+
+    for index in range(10):
+        sampled_out(index)
+    report = Scientist.report.get(name + '_sampled')
+    report.summarize()
+    assert report.statuses == {'disabled': 10}
+
+    with pytest.raises(ValueError):
+        scientist.experiment(name, trial=trial)(lambda *args: args)
+
+    async def async_trial(value):
+        return value
+
+    @scientist.experiment(name + '_async', trial=async_trial)
+    async def async_control(value):
+        return value
+
+    assert asyncio.run(async_control(3)) == 3
+    report = Scientist.report.get(name + '_async')
+    report.summarize()
+    assert report.statuses == {'match': 1}
+
+
+class OldExperiment(Experiment):
+    # an Experiment class written before the executor, sampler and breaker arguments
+    def __init__(self, description, report=None):
+        super(OldExperiment, self).__init__(description, report=report)
+
+
+def test_old_experiment_class():
+    """
+    Experiment classes that only take a description and report can still be used.
+    """
+    with Scientist('test_old_experiment_class', experiment_=OldExperiment) as experiment:
+        experiment.control.function = sub_fib_list
+        experiment.trial.function = sub_fib_list
+        experiment.perform(startNumber=1, endNumber=100)
+    assert experiment.status == 'match'